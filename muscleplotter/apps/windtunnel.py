@@ -1,6 +1,7 @@
 from ..modules.model.plotter import Plotter
 from ..dispatchers.winddispatcher import WindDispatcher
 from ..dispatchers.functiondispatcher import FunctionFromPoints
+from ..modules.windtunnel.windtunnelsimulator import WindSim
 from ..utils.utils import remap
 
 # position in paper, requires cropmark dection
@@ -67,20 +68,30 @@ class WindtunnelDemo(object):
         self.fresh_streamline = True
 
     def find_streamline(self, location):
+        """Switches to plotting the streamline entering at location
+
+        Returns:
+          (bool): whether there was a flow to take the streamline from
+        """
         print("plot: streamline")
-        x, y = self.dispatcher.plot_streamline(
+        line = self.dispatcher.plot_streamline(
             remap(location[1], sketch_area_left_up[1],
-            sketch_area_left_down[1], 200, 0))
+            sketch_area_left_down[1], WindSim.height, 0))
+        if line is None:
+            print("no simulated flow yet")
+            return False
+        x, y = line
         #print zip(x, y)
-        points = zip([remap(xi, 0, 200, sketch_area_left_up[0],
+        points = zip([remap(xi, 0, WindSim.width, sketch_area_left_up[0],
                             sketch_area_right_up[0]) - location[0]
                       for xi in x],
-                     [((yi - y[0]) / 200) * sketch_area_height / 2
+                     [((yi - y[0]) / WindSim.height) * sketch_area_height / 2
                       for yi in y])
         #print points
         self.dispatcher = FunctionFromPoints(location[0],
                                              location[1],
                                              points)
+        return True
 
     def handle_pendown(self, location):
         print("Pen down location {0}".format(location))
@@ -88,8 +99,9 @@ class WindtunnelDemo(object):
            self.fresh_streamline):
             self.fresh_streamline = False
             self.pen_down_was_inside_canvas = False
-            self.find_streamline(location)
-            self.dispatcher.serve(self.plotter, location)
+            # the boundary is not part of the sketch
+            if self.find_streamline(location):
+                self.dispatcher.serve(self.plotter, location)
         elif check_if_inside_sketch_area(location):
             self.dispatcher.serve(self.plotter, location)
             self.pen_down_was_inside_canvas = True
@@ -99,8 +111,9 @@ class WindtunnelDemo(object):
            self.fresh_streamline):
             self.fresh_streamline = False
             self.pen_down_was_inside_canvas = False
-            self.find_streamline(location)
-            self.dispatcher.serve(self.plotter, location)
+            # the boundary is not part of the sketch
+            if self.find_streamline(location):
+                self.dispatcher.serve(self.plotter, location)
         elif (check_if_inside_sketch_area(location) and
               self.pen_down_was_inside_canvas):
             self.dispatcher.serve(self.plotter, location)
@@ -109,11 +122,14 @@ class WindtunnelDemo(object):
         print(location)
         if (check_if_inside_sketch_area(location) and
            self.pen_down_was_inside_canvas):
+            # returns right away, the simulation runs in the background
             self.dispatcher.runSimulation()
+        self.windDispatcher.end_stroke()
         self.plotter.deactivate()
         self.pen_down_was_inside_canvas = False
         self.fresh_streamline = True
         self.dispatcher = self.windDispatcher
 
     def end_application(self):
+        self.windDispatcher.cancel()
         self.plotter.end_plotter()
@@ -1,13 +1,21 @@
-from ..modules.model import canvas
 from ..modules.windtunnel.windtunnelsimulator import WindSim
+from ..modules.windtunnel.lattice import Convergence, resample
+from ..modules.windtunnel.streamlines import StreamFunction
+from ..modules.windtunnel.worker import Worker
+from ..modules.windtunnel.cache import FlowCache
+from ..modules.windtunnel.sketch import (sketch_barrier, DILATE_RADIUS,
+                                         ERODE_RADIUS)
 import numpy as np
 from PIL import Image
-from PIL import ImageOps
-import time
-from scipy.misc import imresize
-import subprocess
-import cv2
-import os
+import sys
+
+if (sys.version_info < (3, 0)):
+    import ConfigParser
+    config = ConfigParser.ConfigParser()
+else:
+    import configparser
+    config = configparser.ConfigParser()
+config.read('configuration/defaults.cfg')
 
 
 class WindDispatcher(object):
@@ -15,11 +23,71 @@ class WindDispatcher(object):
     def __init__(self, start_x, start_y, end_x, end_y):
         super(WindDispatcher, self).__init__()
         self.active_area = (start_x, start_y, end_x, end_y)
+        # pen locations of every stroke
         self.sketches = []
+        self.drawing = False
         self.simulation = None
+        # streamlines of the finished simulation, looked up instead of traced
+        self.stream_function = None
+        # continue from the last flow when the sketch grows, only if there
+        # is no live lattice, which the simulation prefers
+        self.warm_start = config.getboolean('Wind Tunnel', 'warm_start')
+        # simulations run in the background, one at a time
+        self.worker = Worker()
+        # barrier pixels per lattice cell and axis
+        self.barrier_supersample = config.getint('Wind Tunnel',
+                                                 'barrier_supersample')
+        # keep the last barrier as an image for debugging
+        self.save_barrier = config.getboolean('Wind Tunnel', 'save_barrier')
+        # seconds a streamline waits for the simulation in flight
+        self.streamline_wait = config.getfloat('Wind Tunnel',
+                                               'streamline_wait')
+        # after that, use the newest flow of the simulation in flight
+        # rather than the flow of the previous sketch
+        self.anytime = config.getboolean('Wind Tunnel', 'anytime')
+        # newest checkpoint of the simulation in flight and the stream
+        # function of the last one a streamline was looked up in
+        self.snapshot = None
+        self.snapshot_stream = (None, None)
+        # finished flows of earlier sketches, looked up before simulating
+        self.cache = None
+        if config.getboolean('Wind Tunnel', 'cache'):
+            self.cache = FlowCache(
+                'output',
+                config.getint('Wind Tunnel', 'cache_megabytes') * 1024 ** 2)
+        # relax the flow in the background while the sketch is drawn
+        self.live = config.getboolean('Wind Tunnel', 'live')
+        # lattice steps per live batch and seconds between batches
+        self.live_steps = config.getint('Wind Tunnel', 'live_steps')
+        self.live_pause = config.getfloat('Wind Tunnel', 'live_pause')
+        # coarsest lattice of the simulation, relaxed while sketching,
+        # the next simulation continues from it
+        self.live_lattice = None
+        # counts pen locations, tells the live simulation the sketch changed
+        self.revision = 0
+        # the latest simulation and live relaxation submitted to the worker
+        self.simulation_job = None
+        self.relax_job = None
 
     def serve(self, plotter, location):
-        self.sketches.append(location)
+        if not self.drawing:
+            self.sketches.append([])
+            self.drawing = True
+            if self.live:
+                # a simulation still in flight finishes first
+                self.relax_job = self.worker.submit(self.relax,
+                                                    supersede=False)
+        self.sketches[-1].append(location)
+        self.revision += 1
+
+    def end_stroke(self):
+        """The pen was lifted, the next location starts a new stroke. Stops
+        the live relaxation unless a simulation took over from it.
+        """
+        self.drawing = False
+        if self.relax_job is not None:
+            self.relax_job.cancel()
+            self.relax_job = None
 
     def calculate_height_index(self, y):
         """Determines the relative height of the starting point compared
@@ -59,96 +127,196 @@ class WindDispatcher(object):
         return result
 
     def plot_streamline(self, y):
-        if self.simulation:
-            line = self.simulation.get_streamline(y)
+        """Streamline entering the tunnel at row y of the lattice
+
+        Waits up to streamline_wait seconds for the simulation in flight.
+        If it is still running by then, the streamline follows its newest
+        checkpoint in anytime mode and the flow of the previous sketch
+        otherwise, while the simulation carries on for later streamlines.
+
+        Returns:
+          (x, y): the streamline, None if there is no flow yet
+        """
+        # the live relaxation only ends when it is cancelled
+        job = self.simulation_job
+        stream_function = self.stream_function
+        if job is not None and not job.done():
+            # the flow around the latest stroke may be just about ready
+            job.result(self.streamline_wait)
+            stream_function = self.stream_function
+            snapshot = self.snapshot
+            if self.anytime and not job.done() and snapshot is not None:
+                print("Streamline from the flow after {0} steps".format(
+                    snapshot.steps))
+                stream_function = self.snapshot_stream_function(snapshot)
+        if stream_function:
+            line = stream_function.streamline(y)
             return line
 
+    def snapshot_stream_function(self, snapshot):
+        """Stream function of a checkpoint at the full lattice size,
+        computed once per checkpoint
+        """
+        if self.snapshot_stream[0] is snapshot:
+            return self.snapshot_stream[1]
+        shape = (WindSim.height, WindSim.width)
+        ux, uy, barrier = snapshot.ux, snapshot.uy, snapshot.barrier
+        if ux.shape != shape:
+            # a coarse level, streamlines are in full-size rows
+            ux = resample(ux, shape)
+            uy = resample(uy, shape)
+            barrier = resample(barrier.astype(float), shape) >= 0.5
+        stream_function = StreamFunction(ux, uy, barrier)
+        self.snapshot_stream = (snapshot, stream_function)
+        return stream_function
+
+    def report_progress(self, snapshot):
+        print("Simulation: {0}x{1} lattice, {2} steps (residual {3:.2e})"
+              .format(snapshot.ux.shape[0], snapshot.ux.shape[1],
+                      snapshot.steps, snapshot.residual))
+        if snapshot.status != 'diverged':
+            self.snapshot = snapshot
+
     def runSimulation(self):
-        blur_size = 1
-        gray_threshold = 240
-        simulation_width = 200
-        simulation_height = 200
-        # color inverted because of openCV
-        WHITE = 0  # 255,
-        BLACK = 255  # 0
-        # openCV parms
-        DILATE_ITERATIONS = 5
-        DILATE_MATRIX_SIZE = 20
-        ERODE_ITERATIONS = 5
-        SKIP_DILATE = False
-        SKIP_CONTOURS = True
-        SKIP_ERODE = False
-
-        sketch_area_height = round(self.active_area[3] - self.active_area[1])
-        sketch_area_width = round(self.active_area[2] - self.active_area[0])
-
-        wind_area = np.empty(shape=(sketch_area_height, sketch_area_width),
-                             dtype=np.uint8)
-        wind_area[:] = WHITE
-        print("size of image:" + str(wind_area.shape))
-        print("sketches saved: " + str(len(self.sketches)))
-        for point in self.sketches:
-            # print("orig:"+str(point))
-            y = self.remap(point[1], self.active_area[1],
-                           self.active_area[3], 0, sketch_area_height - 1)
-            x = self.remap(point[0], self.active_area[0],
-                           self.active_area[2], 0, sketch_area_width - 1)
-            # print("remaped: " + str([x,y]))
-            for i in range(-blur_size, blur_size):
-                for j in range(-blur_size, blur_size):
-                    # print("saved and blurred "+ str(point))
-                    wind_area[x + i, y + j] = BLACK
-
-        # actually blur here just before the image conversion and rotation
-        #(Image.fromarray(wind_area)).save("wind_pre.png")
-        # kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5,5))
-        kernel = np.ones((DILATE_MATRIX_SIZE, DILATE_MATRIX_SIZE), np.uint8)
-        if not SKIP_DILATE:
-            wind_area = cv2.dilate(wind_area, kernel,
-                                   iterations=DILATE_ITERATIONS)
-
-        # countours
-        full_canvas_img = wind_area
-        if not SKIP_CONTOURS:
-            ret, thresh = cv2.threshold(wind_area, 127, 255, 0)
-            _, contours, _ = cv2.findContours(thresh, cv2.RETR_TREE,
-                                              cv2.CHAIN_APPROX_SIMPLE)
-            #print("openCV/countours")
-            #if isinstance(contours, list):
-            #    print(len(contours))
-            #    if (len(contours) > 0):
-            #        print(len(contours[0]))
-            full_canvas_img = cv2.drawContours(thresh, contours, -1,
-                                               (128, 255, 0), 3)
-
-        # erode those sketches
-        if not SKIP_ERODE:
-            full_canvas_img = cv2.erode(full_canvas_img, kernel,
-                                        ERODE_ITERATIONS)
-
-        # array to image & image manipulation
-        full_canvas_img = Image.fromarray(full_canvas_img)
-        full_canvas_img = full_canvas_img.rotate(90)
-        # full_canvas_img = full_canvas_img.transpose(Image.FLIP_LEFT_RIGHT)
-        # full_canvas_img = full_canvas_img.transpose(Image.FLIP_TOP_BOTTOM)
-        # full_canvas_img = full_canvas_img.rotate(180)
-        # full_canvas_img.save("full.png")
-        # gaussian off for dilate
-        # wind_area = gaussian_filter(wind_area, sigma=gaussian_power)
-        # Image.fromarray(dilated).show()
-        # full_canvas_blur_img = Image.fromarray(wind_area)
-        # full_canvas_blur_img.save("blur.png")
-        scaled_img = imresize(full_canvas_img, (simulation_width,
-                                                simulation_height))
-
-        for i in range(len(scaled_img)):
-            for j in range(len(scaled_img[i])):
-                if scaled_img[i][j] < gray_threshold:
-                    # binarize again (blur and scales erode it)
-                    scaled_img[i][j] = 0
-        scaled_img = Image.fromarray(scaled_img)
-        scaled_img = ImageOps.invert(scaled_img)
-
-        self.simulation = WindSim(scaled_img)
-        scaled_img.save(str(os.getcwd() +
-                            "/muscleplotter/modules/windtunnel/data/load.png"))
+        """Starts simulating the current sketch in the background,
+        cancelling the simulation of an older sketch still in flight.
+
+        Returns:
+          (Job): handle of the simulation, its result is the WindSim (None
+                 if it was cancelled, diverged or the flow came from the
+                 cache)
+        """
+        sketches = [list(stroke) for stroke in self.sketches]
+        if self.simulation_job is not None:
+            # the live relaxation may have been queued behind it
+            self.simulation_job.cancel()
+        self.relax_job = None
+        self.simulation_job = self.worker.submit(
+            lambda job: self.simulate(sketches, job), self.report_progress)
+        return self.simulation_job
+
+    def cancel(self):
+        self.worker.cancel()
+
+    def rasterizer(self, sketches):
+        """Function that draws sketches as the barrier of a lattice of a
+        given (height, width)
+        """
+        def rasterize(shape):
+            return sketch_barrier(sketches, self.active_area, shape,
+                                  self.barrier_supersample,
+                                  DILATE_RADIUS, ERODE_RADIUS)
+        return rasterize
+
+    def relax(self, job):
+        """Relaxes the flow around the sketch on the coarsest lattice while
+        it is drawn, so at pen up the simulation continues from there and
+        mostly the full-size lattice is left to converge. Runs small
+        batches of steps with pauses in between, so pen input and
+        stimulation do not wait for it, until the stroke ends or the
+        simulation at pen up cancels it.
+
+        Every relaxation starts from uniform flow around the sketch drawn
+        so far and runs until it converged before the next one picks up
+        the new pen locations. A flow that followed every change of the
+        barrier would carry the lift of half-drawn shapes around the
+        periodic tunnel for a long time.
+
+        Returns:
+          (Lattice): the live lattice
+        """
+        shape = WindSim.level_shape(WindSim.coarse_levels)
+        lattice = self.live_lattice
+        convergence = None
+        revision = None
+        while not job.cancelled():
+            relaxing = (convergence is not None and
+                        convergence.status == 'running')
+            if revision != self.revision and not relaxing:
+                revision = self.revision
+                barrier = self.rasterizer(
+                    [list(stroke) for stroke in self.sketches])(shape)
+                if lattice is None:
+                    lattice = WindSim.coarse_lattice(barrier)
+                else:
+                    lattice.set_barrier(barrier)
+                    lattice.reset()
+                self.live_lattice = lattice
+                convergence = Convergence(lattice, WindSim.tolerance,
+                                          WindSim.max_steps)
+                relaxing = True
+            if relaxing:
+                lattice.step(self.live_steps)
+                if convergence.checkpoint(self.live_steps) == 'diverged':
+                    # waits for the sketch to change
+                    lattice = self.live_lattice = convergence = None
+            job.pause(self.live_pause)
+        return lattice
+
+    def simulate(self, sketches, job):
+        print("strokes saved: " + str(len(sketches)))
+        # checkpoints of an older sketch are not what was drawn
+        self.snapshot = None
+        rasterize = self.rasterizer(sketches)
+
+        key = None
+        if self.cache is not None:
+            barrier = rasterize((WindSim.height, WindSim.width))
+            key = WindSim.cache_key(barrier)
+            fields = self.cache.load(key)
+            if fields is not None:
+                print("Simulation found in cache")
+                self.stream_function = StreamFunction(
+                    fields[0], fields[1], barrier, psi=fields[2])
+                return None
+
+        previous = self.simulation
+        if not self.warm_start:
+            previous = None
+        simulation = WindSim(rasterize, previous, self.live_lattice)
+        if self.save_barrier:
+            # the barrier as black pixels, what WindSim() loads by default
+            barrier = np.where(simulation.barrier, 0, 255).astype(np.uint8)
+            Image.fromarray(barrier).save(WindSim.full_path + "data/load.png")
+        if WindSim.RENDER:
+            # streamlines do not wait for the movie and the plots
+            simulation.render(job.report, job.cancelled,
+                              lambda: self.publish(simulation, key))
+        else:
+            simulation.run(progress=job.report, cancelled=job.cancelled)
+            self.publish(simulation, key)
+        if self.simulation is not simulation:
+            simulation.close()
+            return None
+        return simulation
+
+    def publish(self, simulation, key=None):
+        """Streamlines are looked up in the flow of a finished simulation
+        from here on, unless it was cancelled or diverged
+
+        Attributes:
+          simulation (WindSim): the finished simulation
+          key (str): the flow is stored in the cache under it, optional
+
+        Returns:
+          (bool): whether the flow was published
+        """
+        status = simulation.convergence.status
+        if status == 'cancelled':
+            return False
+        if status == 'diverged':
+            # streamlines through a blown up flow are meaningless
+            print("Simulation diverged, keeping the previous flow")
+            self.snapshot = None
+            return False
+        self.stream_function = StreamFunction(simulation.ux, simulation.uy,
+                                              simulation.barrier)
+        self.snapshot = None
+        if key is not None and simulation.cold:
+            # warm or live starts depend on what was drawn before
+            self.cache.store(key, simulation.ux, simulation.uy,
+                             self.stream_function.psi)
+        if self.simulation:
+            self.simulation.close()
+        self.simulation = simulation
+        return True
@@ -60,8 +60,24 @@ class Target(object):
         self.canvas = canvas
         self.origin = self.canvas.origin
 
-        coordinates = self.canvas.calculate_target_coordinates()
-        self.x_variables, self.y_variables = coordinates
+        # evaluate the target as the pen advances, not all of it at once
+        if config.getboolean('Reach Control', 'lazy_target'):
+            self.canvas.enable_lazy_target(
+                config.getint('Reach Control', 'target_chunk'),
+                config.getboolean('Reach Control', 'prefetch_target'))
+        self.canvas.calculate_target_coordinates()
+
+    @property
+    def x_variables(self):
+        """x of the whole target on the paper
+        """
+        return self.canvas.target_coordinates()[0]
+
+    @property
+    def y_variables(self):
+        """y of the whole target on the paper
+        """
+        return self.canvas.target_coordinates()[1]
 
     def rotate_and_transform_raw_coordinates(self, point):
         theata = radians(self.canvas.major_axis_tilt)
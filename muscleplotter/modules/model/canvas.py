@@ -1,31 +1,152 @@
 """Manages muscle plotter in specific canvas context
 
 """
-from math import pi, sin, cos, radians, atan
+from collections import OrderedDict
+from math import pi, sin, cos, radians
+import threading
 
 import scipy.interpolate as ip
 import numpy as np
 
+# target shapes kept for plots that are placed again
+TARGET_CACHE_SIZE = 32
+# anoto pixels of the major axis evaluated at once by lazy targets
+TARGET_CHUNK = 512
 
-def find_perpendicular(a):
-    b = np.empty_like(a)
-    b[0] = -a[1]
-    b[1] = a[0]
-    return b
 
+def calculate_distance(p1, p2):
+    return ((p1[0] - p2[0]) ** 2 + (p1[1] - p2[1]) ** 2) ** 0.5
 
-def calculate_segment_intersect(a1, a2, b1, b2):
-    da = a2 - a1
-    db = b2 - b1
-    dp = a1 - b1
-    dap = find_perpendicular(da)
-    denom = np.dot(dap, db)
-    num = np.dot(dap, dp)
-    return (num / denom) * db + b1
 
+class TargetCache(object):
+    """Least recently used target shapes, so that placing a plot again
+    only transforms the shape onto the paper
 
-def calculate_distance(p1, p2):
-    return ((p1[0] - p2[0]) ** 2 + (p1[1] - p2[1]) ** 2) ** 0.5
+    Attributes:
+      size (int): shapes kept at most, 0 keeps none
+      hits, misses (int): lookups so far
+    """
+    def __init__(self, size=TARGET_CACHE_SIZE):
+        super(TargetCache, self).__init__()
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._shapes = OrderedDict()
+
+    def get(self, key, calculate):
+        """The shape stored under key, calculated and stored on a miss
+
+        Attributes:
+          key (tuple): identifies the shape, see Canvas.target_key()
+          calculate (function): returns the (x, y) arrays of the shape
+
+        Returns:
+          (x, y): read-only arrays
+        """
+        shape = self._shapes.pop(key, None)
+        if shape is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            shape = tuple(np.asarray(values) for values in calculate())
+            for values in shape:
+                values.flags.writeable = False
+        if self.size > 0:
+            # the most recently used shape goes last
+            self._shapes[key] = shape
+            while len(self._shapes) > self.size:
+                self._shapes.popitem(last=False)
+        return shape
+
+    def clear(self):
+        self._shapes.clear()
+
+
+# shared by every canvas
+target_cache = TargetCache()
+
+
+class LazyCoordinates(object):
+    """raw_coordinates of a target that are evaluated in chunks of the
+    major axis as they are looked up, so that placing a long or expensive
+    target costs the same as a short one
+
+    Behaves like the (N, 2) array of (x, -y) points around zero for
+    indexing single points.
+
+    Attributes:
+      function (function): y of the target for an array of x
+      length (int): points of the target, one per anoto pixel. A float
+                    span (e.g. of a streamline) is rounded up like
+                    np.arange() does.
+      chunk_size (int): points evaluated at once
+      prefetch (bool): evaluate the chunk after the one looked up on a
+                       background thread
+      chunks ({int: np.ndarray}): evaluated chunks by number
+    """
+    def __init__(self, function, length, chunk_size=TARGET_CHUNK,
+                 prefetch=False):
+        super(LazyCoordinates, self).__init__()
+        self.function = function
+        self.length = int(np.ceil(length))
+        self.chunk_size = chunk_size
+        self.prefetch = prefetch
+        self.chunks = {}
+        self._lock = threading.Lock()
+        self._prefetching = None
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('target index out of range')
+        number, offset = divmod(index, self.chunk_size)
+        return self.chunk(number)[offset]
+
+    def materialize(self):
+        """Every point of the target, the chunks not looked up yet are
+        evaluated now
+
+        Returns:
+          (np.ndarray): (length, 2) points, like raw_coordinates of a
+                        target that is not lazy
+        """
+        chunks = []
+        for number in range(int(np.ceil(float(self.length) /
+                                        self.chunk_size))):
+            chunk = self.chunks.get(number)
+            if chunk is None:
+                chunk = self._evaluate(number)
+            chunks.append(chunk)
+        return np.concatenate(chunks)
+
+    def _evaluate(self, number):
+        start = number * self.chunk_size
+        x = np.arange(start, min(start + self.chunk_size, self.length),
+                      dtype=float)
+        chunk = np.column_stack([x, -1 * self.function(x)])
+        with self._lock:
+            return self.chunks.setdefault(number, chunk)
+
+    def chunk(self, number):
+        """(chunk_size, 2) points of a chunk, evaluated if need be
+        """
+        chunk = self.chunks.get(number)
+        if chunk is None:
+            chunk = self._evaluate(number)
+        following = number + 1
+        if (self.prefetch and following * self.chunk_size < self.length and
+                following not in self.chunks and
+                self._prefetching != following):
+            self._prefetching = following
+            thread = threading.Thread(target=self._evaluate,
+                                      args=(following,))
+            thread.daemon = True
+            thread.start()
+        return chunk
 
 
 class Canvas(object):
@@ -41,6 +162,9 @@ class Canvas(object):
       major_axis_tilt (float): theta in degrees
       major_axis_span (int):
       minor_axis_span (int): amplitute x 2
+      major_axis, minor_axis ((float, float)): unit vectors along and
+                                               across the major axis on
+                                               the paper
     """
     def __init__(self):
         super(Canvas, self).__init__()
@@ -49,10 +173,25 @@ class Canvas(object):
         self.no_boost = False
         self.nudge_on = False
         self.nudges = []
+        self.lazy = False
+        self.chunk_size = TARGET_CHUNK
+        self.prefetch = False
+        # the whole target on the paper and every fifth point of it, lazy
+        # targets place them when they are looked up
+        self._coordinates = None
+        self._target_points = None
 
     def enable_pen_up(self):
         self.plot_once = True
 
+    def enable_lazy_target(self, chunk_size=TARGET_CHUNK, prefetch=False):
+        """Evaluate the target in chunks as the pen advances instead of
+        all of it when it is placed, see LazyCoordinates
+        """
+        self.lazy = True
+        self.chunk_size = chunk_size
+        self.prefetch = prefetch
+
     def disable_guide(self):
         self.no_guide = True
 
@@ -81,123 +220,203 @@ class Canvas(object):
         self.major_axis_tilt = theta
         self.major_axis_span = major
         self.minor_axis_span = minor
+        # the frame targets are placed in, see placement_matrix(). anoto y
+        # increases as you go down the paper
+        tilt = radians(theta)
+        self.major_axis = (cos(tilt), -sin(tilt))
+        self.minor_axis = (sin(tilt), cos(tilt))
+
+    def project(self, x, y):
+        """Coordinates of paper locations in the frame of the canvas
+
+        Attributes:
+          x, y (float or np.ndarray): anoto locations
+
+        Returns:
+          (along, across): distance from the origin along the major axis
+                           and from the major axis across it
+        """
+        dx = x - self.origin[0]
+        dy = y - self.origin[1]
+        return (dx * self.major_axis[0] + dy * self.major_axis[1],
+                dx * self.minor_axis[0] + dy * self.minor_axis[1])
 
     def check_if_inside(self, location):
         """Used to check if observed point is in active ems region
 
         Given the origin and axis tilt, this method projects the
-        observed location and checks whether it falls into
-        the boundries defined by active region.
+        observed location onto the major axis and checks whether it
+        falls into the boundries defined by active region.
 
         Attributes:
           location ((int),(int)): (x, y) of observed anoto location
 
-        Description:
-          a1 ((float),(float)): origin
-          a2: major axis end point
-          b1: observed location as point
-          b2: arbitary point that makes b perpendicular to major axis
-
         Returns:
           true (boolean): when anoto point is inside active region
           'done' (string): when observed location surpasses major axis
         """
-        a1, a2 = self.calculate_major_axis_vectors()
-        b1, b2 = self.calculate_minor_axis_vectors(location)
-        # print a1, a2
-        # print b1, b2
-        intersect = calculate_segment_intersect(a1, a2, b1, b2)
-        a1_to_intersect = (calculate_distance(intersect, a1))
-        a2_to_intersect = (calculate_distance(intersect, a2))
-        b1_to_intersect = (calculate_distance(intersect, b1))
-
-        if (a1_to_intersect < self.major_axis_span and
-           a2_to_intersect < self.major_axis_span):
-            if b1_to_intersect < self.minor_axis_span / 2:
+        along, across = self.project(location[0], location[1])
+        across = abs(across)
+        if 0 < along < self.major_axis_span:
+            if across < self.minor_axis_span / 2:
                 return True
-        elif (a1_to_intersect > self.major_axis_span and
-              a2_to_intersect < self.major_axis_span):
-            if b1_to_intersect < self.minor_axis_span:
+        elif self.major_axis_span < along < 2 * self.major_axis_span:
+            if across < self.minor_axis_span:
                 return 'done'
 
-    def calculate_major_axis_vectors(self):
-        """Defines two vectors that describe origin and end of major axis
-        """
-        v1 = np.array([self.origin[0], self.origin[1]])
-        m = atan(radians(self.major_axis_tilt))
-        v2_x = cos(m) * self.major_axis_span + self.origin[0]
-        v2_y = -1 * sin(m) * self.major_axis_span + self.origin[1]
-        return v1, np.array([v2_x, v2_y])
-
-    def calculate_minor_axis_vectors(self, location):
-        """Defines two vectors from observed location to an arbitary point
-        that defines a perpendicular line segment to the major axis.
+    def classify_locations(self, locations):
+        """check_if_inside() of many observed locations at once, e.g. of a
+        recorded trace
+
+        Attributes:
+          locations (np.ndarray): (N, 2) anoto locations
+
+        Returns:
+          (inside, done): (N,) booleans, where check_if_inside() is True
+                          and where it is 'done'
         """
-        x, y = location
-        v1 = np.array([x, y])
-        denum = atan(radians(self.major_axis_tilt))
-        if denum == 0:
-            return v1, np.array([x, y + 1])
-        m = - 1 / denum
-        v2_x = cos(m) * x
-        v2_y = -1 * sin(m) * y
-        return v1, np.array([v2_x, v2_y])
+        locations = np.asarray(locations, dtype=float)
+        along, across = self.project(locations[:, 0], locations[:, 1])
+        across = np.abs(across)
+        span = self.major_axis_span
+        inside = ((along > 0) & (along < span) &
+                  (across < self.minor_axis_span / 2))
+        done = ((along > span) & (along < 2 * span) &
+                (across < self.minor_axis_span))
+        return inside, done
 
     def revert_y_axis(self, coordinates):
         """Anoto y increases as you go down the paper.
         This method reverts calculated coordinates to map that
 
         Attributes:
-          coordinates [((float),(float))]: array of points (x, y)
+          coordinates (np.ndarray): (N, 2) points (x, y)
         """
-        reverted_coordinates = []
-        for point in coordinates:
-            reverted_coordinates.append((point[0], -1 * point[1]))
-        return reverted_coordinates
-
-    def tilt_around_zero(self, coordinates):
-        """Rotate target for the required orientation
+        return np.asarray(coordinates, dtype=float) * (1, -1)
 
-        Attributes:
-          coordinates [((float),(float))]: array of points (x, y)
+    def rotation_matrix(self):
+        """Rotates (N, 2) row vectors by the major axis tilt when they are
+        multiplied by it from the right
         """
         theata = radians(self.major_axis_tilt)
-        rm = np.array([[cos(theata), -sin(theata)],
-                      [sin(theata), cos(theata)]], dtype='f')
-        rotated_coordinates = []
-        for point in coordinates:
-            rotated_coordinates.append(np.dot(point, rm))
-        return rotated_coordinates
+        return np.array([[cos(theata), -sin(theata)],
+                         [sin(theata), cos(theata)]], dtype='f')
 
-    def shift_to_origin(self, coordinates):
-        """Map calculated coordinates to the origin on the paper.
+    def placement_matrix(self):
+        """Affine map from target coordinates to the paper: reverts the y
+        axis, tilts around zero and shifts to the origin at once
 
-        Attributes:
-          coordinates [((float),(float))]: array of points (x, y)
+        Returns:
+          (np.ndarray): (3, 3) matrix, (x, y, 1) rows multiplied by it
+                        from the right are placed on the paper
         """
-        normalized_coordinates = []
-        for point in coordinates:
-            normalized_coordinates.append((self.origin[0] + point[0],
-                                           self.origin[1] + point[1]))
-        return normalized_coordinates
-
-    def normalize_to_zero(self, y_coordinates):
-        vertical_offset = y_coordinates[0]
-        if vertical_offset == 0:
-            return y_coordinates
-        fix_offset = np.vectorize(lambda x: x - vertical_offset)
-        y_coordinates = fix_offset(y_coordinates)
-        return y_coordinates
+        placement = np.zeros((3, 3))
+        placement[:2, :2] = self.rotation_matrix()
+        placement[1, :2] *= -1
+        placement[2, :2] = self.origin
+        placement[2, 2] = 1
+        return placement
+
+    def target_parameters(self):
+        """Everything the shape of the target depends on besides the
+        major axis span, in a hashable tuple
+        """
+        raise NotImplementedError
+
+    def target_key(self):
+        return ((type(self), self.major_axis_span) +
+                self.target_parameters())
+
+    def target_function(self):
+        """The target around zero
+
+        Returns:
+          (function): y of the target for an array of x
+        """
+        raise NotImplementedError
+
+    def calculate_target_shape(self):
+        """Target coordinates around zero
+
+        Returns:
+          (x, y): arrays of one point per anoto pixel of the major axis
+        """
+        x_variables = np.arange(self.major_axis_span, dtype=float)
+        return x_variables, self.target_function()(x_variables)
+
+    def calculate_target_coordinates(self):
+        """Places the target on the paper, shapes of earlier placements
+        with the same parameters are looked up in target_cache.
+
+        Lazy targets only evaluate their first chunk here, the rest of
+        raw_coordinates follows as it is looked up. target_coordinates()
+        and target_points cover the whole target either way.
+
+        Returns:
+          (np.ndarray): (2, N) x and y of the target on the paper, of the
+                        first chunk of lazy targets
+        """
+        if self.lazy:
+            raw_coordinates = LazyCoordinates(
+                self.target_function(), self.major_axis_span,
+                self.chunk_size, self.prefetch)
+            first = raw_coordinates.chunk(0)
+            coordinates = self.prepare_coordinates(first[:, 0],
+                                                   -1 * first[:, 1])
+            self.raw_coordinates = raw_coordinates
+            self._coordinates = self._target_points = None
+            return coordinates
+        x_variables, y_variables = target_cache.get(
+            self.target_key(), self.calculate_target_shape)
+        return self.prepare_coordinates(x_variables, y_variables)
 
     def prepare_coordinates(self, x_var, y_var):
-        coordinates = zip(x_var, y_var)
-        coordinates = self.revert_y_axis(coordinates)
-        self.raw_coordinates = coordinates[:]
-        coordinates = self.tilt_around_zero(coordinates)
-        coordinates = self.shift_to_origin(coordinates)
-        self.target_points = coordinates[::5]
-        coordinates = zip(*coordinates)
-        return coordinates
+        """Places target coordinates on the paper
+
+        Attributes:
+          x_var, y_var (np.ndarray): target coordinates around zero
+
+        Returns:
+          (np.ndarray): (2, N) x and y of the target on the paper
+        """
+        self.raw_coordinates = self.revert_y_axis(
+            np.column_stack([x_var, y_var]))
+        coordinates = self.place(x_var, y_var)
+        self._target_points = coordinates[::5]
+        self._coordinates = coordinates.T
+        return self._coordinates
+
+    def place(self, x_var, y_var):
+        """Target coordinates around zero on the paper
+
+        Returns:
+          (np.ndarray): (N, 2) points on the paper
+        """
+        points = np.column_stack([x_var, y_var, np.ones(len(x_var))])
+        return np.dot(points, self.placement_matrix())[:, :2]
+
+    def target_coordinates(self):
+        """The whole target on the paper, lazy targets evaluate the
+        chunks the pen has not reached yet on the first call
+
+        Returns:
+          (np.ndarray): (2, N) x and y of the target on the paper
+        """
+        if self._coordinates is None:
+            raw = self.raw_coordinates.materialize()
+            self._coordinates = self.place(raw[:, 0], -1 * raw[:, 1]).T
+        return self._coordinates
+
+    @property
+    def target_points(self):
+        """Every fifth point of the whole target on the paper, to draw
+        it. Lazy targets only evaluate these points, not their chunks.
+        """
+        if self._target_points is None:
+            x_var = np.arange(0, self.major_axis_span, 5, dtype=float)
+            self._target_points = self.place(
+                x_var, self.raw_coordinates.function(x_var))
+        return self._target_points
 
 
 class SimpleFunction(Canvas):
@@ -209,19 +428,16 @@ class SimpleFunction(Canvas):
         self.constants = constants
         self.scaling = scaling
 
-    def calculate_target_coordinates(self):
+    def target_parameters(self):
+        return (self.scaling,) + tuple(self.constants)
 
-        def simple_function(x):
-            y = 0
-            x = float(x)
-            for i, c in enumerate(reversed(self.constants)):
-                y += c * (x / 2000) ** i
-            return (y * self.scaling)
+    def target_function(self):
 
-        calculate = np.vectorize(simple_function)
-        x_variables = np.arange(self.major_axis_span, dtype=float)
-        y_variables = calculate(x_variables)
-        return self.prepare_coordinates(x_variables, y_variables)
+        def simple_function(x):
+            # constants of the highest power first, x in units of 2000
+            # pixels
+            return np.polyval(self.constants, x / 2000.0) * self.scaling
+        return simple_function
 
 
 class SimpleSine(Canvas):
@@ -238,20 +454,20 @@ class SimpleSine(Canvas):
         self.amplitude = amplitude
         self.phase = phase
 
-    def calculate_target_coordinates(self):
+    def target_parameters(self):
+        return (self.period, self.amplitude, self.phase)
+
+    def target_function(self):
 
         amplitude = self.amplitude
         coef = (2 * pi) / self.period
         phase = radians(self.phase)
+        # shifted so that the target starts at zero
+        vertical_offset = amplitude * np.sin(np.zeros(1) - phase)[0]
 
         def simple_sine(x):
-            return (amplitude * sin((x * coef - phase)))
-        calculate = np.vectorize(simple_sine)
-
-        x_variables = np.arange(self.major_axis_span, dtype=float)
-        y_variables = calculate(x_variables)
-        y_variables = self.normalize_to_zero(y_variables)
-        return self.prepare_coordinates(x_variables, y_variables)
+            return amplitude * np.sin(x * coef - phase) - vertical_offset
+        return simple_sine
 
 
 class ConnectPoints(Canvas):
@@ -266,13 +482,14 @@ class ConnectPoints(Canvas):
         super(ConnectPoints, self).__init__()
         self.points = points
 
-    def calculate_target_coordinates(self):
+    def target_parameters(self):
+        return tuple(tuple(point) for point in self.points)
+
+    def target_function(self):
 
-        x_variables = np.arange(self.major_axis_span, dtype=int)
         xp = [p[0] for p in self.points]
         fp = [p[1] for p in self.points]
-        fitline = ip.UnivariateSpline(xp, fp)
-        return self.prepare_coordinates(x_variables, fitline(x_variables))
+        return ip.UnivariateSpline(xp, fp)
 
 
 class ConnectAsSegments(Canvas):
@@ -287,10 +504,11 @@ class ConnectAsSegments(Canvas):
         super(ConnectAsSegments, self).__init__()
         self.points = points
 
-    def calculate_target_coordinates(self):
+    def target_parameters(self):
+        return tuple(tuple(point) for point in self.points)
+
+    def target_function(self):
 
-        x_variables = np.arange(self.major_axis_span, dtype=int)
         xp = [p[0] for p in self.points]
         fp = [p[1] for p in self.points]
-        fitline = ip.interp1d(xp, fp, 'linear')
-        return self.prepare_coordinates(x_variables, fitline(x_variables))
+        return ip.interp1d(xp, fp, 'linear')
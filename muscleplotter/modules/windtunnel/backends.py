@@ -0,0 +1,263 @@
+"""Compute backends that advance a Lattice.
+
+NumpyBackend runs the reference code in lattice.py. NumexprBackend fuses
+the collision arithmetic of each direction into one pass, NumbaBackend
+streams, bounces back and collides every cell in a single pass over
+memory. Both are optional: when their package is not installed they fall
+back to numpy.
+"""
+from __future__ import division, print_function
+
+import numpy as np
+
+from lattice import VELOCITIES, WEIGHTS, INFLOW
+from tiles import SKIP, COMPUTE, FREEZE
+
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+class NumpyBackend(object):
+    """Reference implementation, the stream/collide code of Lattice
+    """
+    name = 'numpy'
+    # walks the lattice in tiles, see Lattice.use_tiles()
+    tiled = False
+
+    @staticmethod
+    def available():
+        return True
+
+    def step(self, lattice, steps):
+        for _ in range(steps):
+            lattice.stream()
+            lattice.collide()
+
+
+class NumexprBackend(object):
+    """Streams with numpy and collides with one numexpr pass per direction
+    """
+    name = 'numexpr'
+    tiled = False
+
+    # e.u for each direction, in DIRECTIONS order
+    projections = ['({0} * ux + {1} * uy)'.format(east, north)
+                   for north, east in VELOCITIES]
+
+    @staticmethod
+    def available():
+        return numexpr is not None
+
+    def step(self, lattice, steps):
+        for _ in range(steps):
+            lattice.stream()
+            self.collide(lattice)
+
+    def collide(self, lattice):
+        # float32 lattices are computed in float64 blockwise, only the
+        # results are rounded, the memory traffic stays float32
+        casting = 'same_kind'
+        f = lattice.populations
+        names = dict(('f{0}'.format(i), f[i]) for i in range(9))
+        numexpr.evaluate('f0 + f1 + f2 + f3 + f4 + f5 + f6 + f7 + f8',
+                         local_dict=names, out=lattice.rho, casting=casting)
+        names['rho'] = lattice.rho
+        numexpr.evaluate('(f3 + f5 + f6 - f4 - f7 - f8) / rho',
+                         local_dict=names, out=lattice.ux, casting=casting)
+        numexpr.evaluate('(f1 + f5 + f7 - f2 - f6 - f8) / rho',
+                         local_dict=names, out=lattice.uy, casting=casting)
+        ux, uy = lattice.ux, lattice.uy
+        omu215 = numexpr.evaluate('1 - 1.5 * (ux * ux + uy * uy)',
+                                  out=lattice._omu215, casting=casting)
+        for i, eu in enumerate(self.projections):
+            expression = ('(1 - omega) * fi + omega * weight * rho * '
+                          '(omu215 + 3 * {0} + 4.5 * {0} * {0})'.format(eu))
+            numexpr.evaluate(expression,
+                             local_dict={'fi': f[i], 'rho': lattice.rho,
+                                         'ux': ux, 'uy': uy,
+                                         'omu215': omu215,
+                                         'omega': lattice.omega,
+                                         'weight': WEIGHTS[i]},
+                             out=f[i], casting=casting)
+        for i in INFLOW:
+            f[i][..., :1] = lattice.inflow[i]
+
+
+if numba is not None:
+    # exact in float32, so they do not promote float32 arithmetic
+    _ONE = np.float32(1)
+    _ONE_HALF = np.float32(1.5)
+    _THREE = np.float32(3)
+    _FOUR_HALF = np.float32(4.5)
+
+    @numba.njit(inline='always')
+    def _update_cell(src, dst, barrier, rho, ux, uy, omega, inflow, weights,
+                     y, x, yn, ys):
+        """Pull-streaming, bounce-back and collision of one cell.
+
+        Bounce-back reproduces the sequential mask assignments of
+        Lattice.bounce_back exactly, barrier cells included: the first
+        direction of each pair takes the opposite population of its own
+        cell, the second one only does so when the cell itself is fluid.
+        yn and ys are the rows the north and south moving populations
+        come from, the caller computes them once per row.
+        """
+        width = barrier.shape[1]
+        w0 = weights[0]
+        w1 = weights[1]
+        w2 = weights[5]
+        # columns the east and west moving populations come from
+        xe = (x - 1) % width
+        xw = (x + 1) % width
+        solid = barrier[y, x]
+
+        f0 = src[0, y, x]
+        if barrier[yn, x]:
+            fN = src[2, y, x]
+        else:
+            fN = src[1, yn, x]
+        if barrier[y, xe]:
+            fE = src[4, y, x]
+        else:
+            fE = src[3, y, xe]
+        if barrier[yn, xe]:
+            fNE = src[8, y, x]
+        else:
+            fNE = src[5, yn, xe]
+        if barrier[yn, xw]:
+            fNW = src[6, y, x]
+        else:
+            fNW = src[7, yn, xw]
+        fS = src[2, ys, x]
+        if barrier[ys, x] and not solid:
+            fS = src[1, y, x]
+        fW = src[4, y, xw]
+        if barrier[y, xw] and not solid:
+            fW = src[3, y, x]
+        fSE = src[6, ys, xe]
+        if barrier[ys, xe] and not solid:
+            fSE = src[7, y, x]
+        fSW = src[8, ys, xw]
+        if barrier[ys, xw] and not solid:
+            fSW = src[5, y, x]
+
+        r = f0 + fN + fS + fE + fW + fNE + fSE + fNW + fSW
+        vx = (fE + fNE + fSE - fW - fNW - fSW) / r
+        vy = (fN + fNE + fNW - fS - fSE - fSW) / r
+        rho[y, x] = r
+        ux[y, x] = vx
+        uy[y, x] = vy
+        omu215 = _ONE - _ONE_HALF * (vx * vx + vy * vy)
+        keep = _ONE - omega
+        dst[0, y, x] = keep * f0 + omega * w0 * r * omu215
+        dst[1, y, x] = keep * fN + omega * w1 * r * (
+            omu215 + _THREE * vy + _FOUR_HALF * vy * vy)
+        dst[2, y, x] = keep * fS + omega * w1 * r * (
+            omu215 - _THREE * vy + _FOUR_HALF * vy * vy)
+        dst[3, y, x] = keep * fE + omega * w1 * r * (
+            omu215 + _THREE * vx + _FOUR_HALF * vx * vx)
+        dst[4, y, x] = keep * fW + omega * w1 * r * (
+            omu215 - _THREE * vx + _FOUR_HALF * vx * vx)
+        eu = vx + vy
+        dst[5, y, x] = keep * fNE + omega * w2 * r * (
+            omu215 + _THREE * eu + _FOUR_HALF * eu * eu)
+        dst[8, y, x] = keep * fSW + omega * w2 * r * (
+            omu215 - _THREE * eu + _FOUR_HALF * eu * eu)
+        eu = vx - vy
+        dst[6, y, x] = keep * fSE + omega * w2 * r * (
+            omu215 + _THREE * eu + _FOUR_HALF * eu * eu)
+        dst[7, y, x] = keep * fNW + omega * w2 * r * (
+            omu215 - _THREE * eu + _FOUR_HALF * eu * eu)
+        # force steady rightward flow at the west end
+        if x == 0:
+            for i in range(3, 9):
+                dst[i, y, 0] = inflow[i]
+
+    @numba.njit(parallel=True)
+    def _fused_step(src, dst, barrier, rho, ux, uy, omega, inflow, weights,
+                    tiles, tile):
+        """One pass over memory that streams, bounces back and collides.
+
+        The lattice is walked in square tiles of tile cells, tiles says
+        for each of them whether it is skipped, computed or frozen (see
+        tiles.py). Skipped tiles are left alone, frozen ones keep their
+        populations.
+        """
+        height, width = barrier.shape
+        for ty in numba.prange(tiles.shape[0]):
+            for tx in range(tiles.shape[1]):
+                state = tiles[ty, tx]
+                if state == SKIP:
+                    continue
+                top = ty * tile
+                bottom = min(top + tile, height)
+                left = tx * tile
+                right = min(left + tile, width)
+                if state == FREEZE:
+                    dst[:, top:bottom, left:right] = \
+                        src[:, top:bottom, left:right]
+                    continue
+                for y in range(top, bottom):
+                    yn = (y - 1) % height
+                    ys = (y + 1) % height
+                    for x in range(left, right):
+                        _update_cell(src, dst, barrier, rho, ux, uy,
+                                     omega, inflow, weights, y, x, yn, ys)
+
+
+class NumbaBackend(object):
+    """Fused single-pass kernel compiled with numba
+    """
+    name = 'numba'
+    tiled = True
+
+    @staticmethod
+    def available():
+        return numba is not None
+
+    def step(self, lattice, steps):
+        # every value in the precision of the lattice
+        inflow = np.array(lattice.inflow, lattice.dtype)
+        weights = np.array(WEIGHTS, lattice.dtype)
+        omega = lattice.dtype.type(lattice.omega)
+        tiles = lattice.tiles
+        if tiles is None:
+            # a single tile covering the lattice
+            size = max(lattice.height, lattice.width)
+            states = np.array([[COMPUTE]], np.int8)
+        else:
+            size = tiles.size
+        for _ in range(steps):
+            if tiles is not None:
+                states = tiles.plan(lattice.ux, lattice.uy)
+            _fused_step(lattice.populations, lattice._streamed,
+                        lattice.barrier, lattice.rho, lattice.ux, lattice.uy,
+                        omega, inflow, weights, states, size)
+            lattice.swap_buffers()
+
+
+BACKENDS = {NumpyBackend.name: NumpyBackend,
+            NumexprBackend.name: NumexprBackend,
+            NumbaBackend.name: NumbaBackend}
+
+
+def get_backend(name='numpy'):
+    """Instantiates a backend by name, falls back to numpy if the
+    backend's package is not installed.
+    """
+    if name not in BACKENDS:
+        raise ValueError('Unknown wind tunnel backend "{0}", choose one of {1}'
+                         .format(name, sorted(BACKENDS)))
+    backend = BACKENDS[name]
+    if not backend.available():
+        print('Wind tunnel backend "{0}" is not installed, using numpy'
+              .format(name))
+        backend = NumpyBackend
+    return backend()
@@ -0,0 +1,174 @@
+"""Benchmarks the wind tunnel engine headless and reports JSON.
+
+Every combination of reference sketch, lattice size, backend and
+precision runs in a fresh process, so peak memory and numba compilation
+of one case do not leak into the next. Each case reports million lattice
+updates per second (MLUPS), the time of every phase from barrier
+construction to rendering, the latency from the start of the simulation
+to the first streamline the plotter can look up and the peak resident
+memory.
+
+Example:
+    $ python -m muscleplotter.modules.windtunnel.benchmark --sizes 200 400
+"""
+from __future__ import division, print_function
+
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+
+import numpy as np
+
+from lattice import Lattice
+from backends import BACKENDS, get_backend
+from references import SKETCHES, reference_barrier
+from renderer import colormap_lut, colour_frame
+from streamlines import StreamFunction, trace_streamlines
+from tiles import Tiles
+
+# seed rows every this fraction of the tunnel height
+SEED_SPACING = 0.05
+# steps between rendered frames
+FRAME_EVERY = 20
+
+
+def _peak_memory():
+    """Peak resident memory of this process in megabytes
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def run_case(case):
+    """Runs one benchmark case, see main() for the keys of case
+
+    Returns:
+      (dict): the case with its measurements
+    """
+    height = width = case['size']
+    dtype = np.dtype(case['precision'])
+    backend = get_backend(case['backend'])
+    phases = {}
+
+    start = time.time()
+    barrier = reference_barrier(case['sketch'], (height, width))
+    phases['barrier'] = time.time() - start
+
+    lattice = Lattice(height, width, backend=backend, dtype=dtype)
+    lattice.set_barrier(barrier)
+    # compiles numba kernels outside of the measurement
+    lattice.step(1)
+    lattice.reset()
+    if case['tile_size'] and backend.tiled:
+        lattice.use_tiles(Tiles(height, width, case['tile_size'],
+                                case['quiescent_tolerance']))
+    # the dispatcher simulates, publishes the stream function and the
+    # plotter looks up a streamline, the latency spans all of it
+    start = time.time()
+    lattice.step(case['steps'])
+    published = time.time()
+    phases['simulation'] = published - start
+
+    seeds = np.arange(SEED_SPACING, 1, SEED_SPACING) * (height - 1)
+    stream_function = StreamFunction(lattice.ux, lattice.uy, barrier)
+    stream_function.streamline(seeds[0])
+    latency = time.time() - start
+    for seed in seeds[1:]:
+        stream_function.streamline(seed)
+    phases['stream_function'] = time.time() - published
+    start = time.time()
+    trace_streamlines(lattice.ux, lattice.uy, seeds, barrier=barrier)
+    phases['trace'] = time.time() - start
+
+    # colouring only, encoding runs in a background thread anyway
+    lut = colormap_lut()
+    start = time.time()
+    for _ in range(case['steps'] // FRAME_EVERY):
+        colour_frame(lattice.curl(), barrier, lut, scale=4)
+    phases['rendering'] = time.time() - start
+
+    result = dict(case)
+    result.update({
+        'backend': backend.name,
+        'mlups': height * width * case['steps'] / phases['simulation'] / 1e6,
+        'phases': phases,
+        'latency': latency,
+        # lattice updates left out by tiled backends
+        'skipped': (lattice.tiles.skipped_fraction
+                    if lattice.tiles is not None else 0.0),
+        'peak_memory_mb': _peak_memory(),
+    })
+    return result
+
+
+def _isolated(case):
+    """Runs a case in a fresh process
+    """
+    pool = multiprocessing.Pool(1)
+    try:
+        return pool.apply(run_case, (case,))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sketches', nargs='+', default=sorted(SKETCHES),
+                        choices=sorted(SKETCHES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[100, 200])
+    parser.add_argument('--backends', nargs='+', choices=sorted(BACKENDS),
+                        default=[name for name, backend
+                                 in sorted(BACKENDS.items())
+                                 if backend.available()])
+    parser.add_argument('--precisions', nargs='+',
+                        choices=['float64', 'float32'],
+                        default=['float64', 'float32'])
+    parser.add_argument('--steps', type=int, default=200,
+                        help='lattice steps per case')
+    parser.add_argument('--tile-size', type=int, default=16,
+                        help='tiles of solid cells are skipped, 0 disables')
+    parser.add_argument('--quiescent-tolerance', type=float, default=0,
+                        help='freeze tiles whose flow changes less')
+    parser.add_argument('--output', help='JSON file, standard out if omitted')
+    options = parser.parse_args(arguments)
+
+    results = []
+    for sketch in options.sketches:
+        for size in options.sizes:
+            for backend in options.backends:
+                for precision in options.precisions:
+                    case = {'sketch': sketch, 'size': size,
+                            'backend': backend, 'precision': precision,
+                            'steps': options.steps,
+                            'tile_size': options.tile_size,
+                            'quiescent_tolerance':
+                                options.quiescent_tolerance}
+                    results.append(_isolated(case))
+                    print('{sketch} {size}x{size} {backend} {precision}: '
+                          '{mlups:.1f} MLUPS, skipped {skipped:.0%}'
+                          .format(**results[-1]),
+                          file=sys.stderr)
+    report = {
+        'machine': {'python': platform.python_version(),
+                    'numpy': np.__version__,
+                    'platform': platform.platform(),
+                    'cpus': multiprocessing.cpu_count()},
+        'results': results,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True,
+                      separators=(',', ': '))
+    if options.output:
+        with open(options.output, 'w') as output:
+            output.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Content-addressed cache of finished wind tunnel flows.
+
+The same sketches come up again and again: demos, reruns after a crash,
+several participants tracing the same template. A finished flow is saved
+as one .npy file named after a hash of its barrier and of every parameter
+that changes the result, and is memory-mapped instead of simulated the
+next time the same barrier shows up. Once the entries take up more than
+the size limit, the least recently used ones are removed.
+"""
+from __future__ import division
+
+import glob
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+# entries are named PREFIX + key + '.npy', nothing else is ever evicted
+PREFIX = 'windcache-'
+
+
+def flow_key(barrier, **parameters):
+    """Hash of a barrier and the parameters of its simulation
+
+    Attributes:
+      barrier (np.ndarray): (height, width) boolean solid cells
+      parameters: everything else the flow depends on, e.g. viscosity
+
+    Returns:
+      (str): hex digest
+    """
+    barrier = np.asarray(barrier, dtype=bool)
+    digest = hashlib.sha1()
+    digest.update(repr(barrier.shape).encode('ascii'))
+    digest.update(np.packbits(barrier).tobytes())
+    digest.update(repr(sorted(parameters.items())).encode('ascii'))
+    return digest.hexdigest()
+
+
+class FlowCache(object):
+    """Finished flows on disk, one (3, height, width) ux, uy, psi array
+    per key
+
+    Attributes:
+      directory (str): where the entries live
+      max_bytes (int): least recently used entries are removed once all of
+                       them take up more than this
+      hits, misses (int): lookups so far
+    """
+    def __init__(self, directory='output', max_bytes=200 * 1024 ** 2):
+        super(FlowCache, self).__init__()
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, key):
+        return os.path.join(self.directory, PREFIX + key + '.npy')
+
+    def load(self, key):
+        """Looks up a flow
+
+        Returns:
+          (np.ndarray): read-only memory map of the stacked ux, uy and psi
+                        fields, None if the key is not cached
+        """
+        path = self.path(key)
+        try:
+            fields = np.load(path, mmap_mode='r')
+        except (IOError, OSError, ValueError):
+            # not cached, or a broken file that the next store replaces
+            self.misses += 1
+            return None
+        # the modification time orders the entries for eviction, access
+        # times are not updated on every file system
+        os.utime(path, None)
+        self.hits += 1
+        return fields
+
+    def store(self, key, ux, uy, psi):
+        """Saves a flow and evicts old entries if the cache is too big
+        """
+        fields = np.array([ux, uy, psi])
+        if fields.nbytes > self.max_bytes:
+            return
+        handle, temporary = tempfile.mkstemp(suffix='.tmp',
+                                             dir=self.directory)
+        with os.fdopen(handle, 'wb') as output:
+            np.save(output, fields)
+        # readers never see a half written entry
+        os.rename(temporary, self.path(key))
+        self.evict()
+
+    def entries(self):
+        """(modification time, bytes, path) of every entry, oldest first
+        """
+        entries = []
+        for path in glob.glob(os.path.join(self.directory,
+                                           PREFIX + '*.npy')):
+            try:
+                status = os.stat(path)
+            except OSError:
+                # evicted in the meantime
+                continue
+            entries.append((status.st_mtime, status.st_size, path))
+        return sorted(entries)
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits
+        into max_bytes
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
@@ -0,0 +1,436 @@
+"""D2Q9 lattice-Boltzmann engine used by the wind tunnel simulator.
+
+Derived from the solver found at http://physics.weber.edu/schroeder/fluids
+(credits remain with original authors). Unlike the original, every array
+belongs to a Lattice instance and is updated in place, so several
+simulations can live side by side and a step allocates (almost) nothing.
+"""
+from __future__ import division
+
+import numpy as np
+
+# population order, axis 0 is north-south (+ is north),
+# axis 1 is east-west (+ is east)
+DIRECTIONS = ('0', 'N', 'S', 'E', 'W', 'NE', 'SE', 'NW', 'SW')
+# (north, east) displacement of each population per step
+VELOCITIES = ((0, 0), (1, 0), (-1, 0), (0, 1), (0, -1),
+              (1, 1), (-1, 1), (1, -1), (-1, -1))
+# lattice-Boltzmann weight factors
+WEIGHTS = (4.0 / 9.0,
+           1.0 / 9.0, 1.0 / 9.0, 1.0 / 9.0, 1.0 / 9.0,
+           1.0 / 36.0, 1.0 / 36.0, 1.0 / 36.0, 1.0 / 36.0)
+# (direction, opposite) pairs in the order bounce-back is applied
+BOUNCE_BACK = ((1, 2), (2, 1), (3, 4), (4, 3),
+               (5, 8), (7, 6), (6, 7), (8, 5))
+# populations that are forced to the inflow at the west end
+INFLOW = (3, 4, 5, 6, 7, 8)
+# speeds above this are blowing up (the lattice speed of sound is 0.577)
+RUNAWAY_SPEED = 0.5
+
+
+def _wrap_slices(shift):
+    """(destination, source) slice pairs of a periodic shift by -1, 0 or 1
+    """
+    if shift == 1:
+        return ((slice(1, None), slice(None, -1)),
+                (slice(0, 1), slice(-1, None)))
+    elif shift == -1:
+        return ((slice(None, -1), slice(1, None)),
+                (slice(-1, None), slice(0, 1)))
+    return ((slice(None), slice(None)),)
+
+
+def equilibrium(rho, ux, uy):
+    """Equilibrium populations for the given macroscopic quantities
+
+    Attributes:
+      rho, ux, uy (float or array): density and velocity
+
+    Returns:
+      [float or array]: one entry per direction in DIRECTIONS order
+    """
+    u2 = ux * ux + uy * uy
+    populations = []
+    for (north, east), weight in zip(VELOCITIES, WEIGHTS):
+        eu = east * ux + north * uy
+        populations.append(weight * rho *
+                           (1 - 1.5 * u2 + 3 * eu + 4.5 * eu * eu))
+    return populations
+
+
+def _resample_positions(old, new):
+    """Lower neighbour and weight of the upper one for every new cell
+    centre, cell centres of both grids aligned
+    """
+    centres = np.clip((np.arange(new) + 0.5) * old / new - 0.5, 0, old - 1)
+    lower = np.minimum(centres.astype(int), max(old - 2, 0))
+    return lower, centres - lower
+
+
+def resample(field, shape):
+    """Bilinear resampling of the last two axes onto another grid size
+
+    Attributes:
+      field (np.ndarray): (..., rows, columns) array
+      shape ((int, int)): new (rows, columns)
+    """
+    rows, row_weight = _resample_positions(field.shape[-2], shape[0])
+    upper = np.minimum(rows + 1, field.shape[-2] - 1)
+    row_weight = row_weight[:, np.newaxis]
+    field = (field[..., rows, :] * (1 - row_weight) +
+             field[..., upper, :] * row_weight)
+    columns, column_weight = _resample_positions(field.shape[-1], shape[1])
+    upper = np.minimum(columns + 1, field.shape[-1] - 1)
+    return (field[..., columns] * (1 - column_weight) +
+            field[..., upper] * column_weight)
+
+
+def curl(ux, uy):
+    """Curl of a macroscopic velocity field (periodic boundaries), over
+    the last two axes
+    """
+    return (np.roll(uy, -1, axis=-1) -
+            np.roll(uy, 1, axis=-1) -
+            np.roll(ux, -1, axis=-2) +
+            np.roll(ux, 1, axis=-2))
+
+
+class Convergence(object):
+    """Tracks how much the velocity field still changes between checkpoints
+
+    Attributes:
+      tolerance (float): residual below which the flow counts as steady
+      max_steps (int): step budget
+      status (str): 'running', 'converged', 'diverged' (NaN or runaway
+                    velocities), 'budget' (ran out of steps) or
+                    'cancelled' (stopped from outside)
+      steps (int): steps run so far
+      residual (float): summed change of |ux| and |uy| since the previous
+                        checkpoint, relative to the summed speeds
+      interpolated (bool): the lattice starts from a flow interpolated
+                           from another size. Its first checkpoint only
+                           measures the change from the interpolation, the
+                           flow cannot converge before the second one.
+    """
+    def __init__(self, lattice, tolerance, max_steps, interpolated=False):
+        super(Convergence, self).__init__()
+        self.lattice = lattice
+        self.tolerance = tolerance
+        self.max_steps = max_steps
+        self.interpolated = interpolated
+        self.status = 'running'
+        self.steps = 0
+        self.residual = float('inf')
+        self._ux = lattice.ux.copy()
+        self._uy = lattice.uy.copy()
+        self._change = np.empty_like(self._ux)
+
+    def _absolute_change(self, field, previous):
+        np.subtract(field, previous, out=self._change)
+        np.abs(self._change, out=self._change)
+        change = self._change.sum()
+        previous[...] = field
+        return change
+
+    def checkpoint(self, steps):
+        """Call after the lattice ran another number of steps
+
+        Returns:
+          (str): the updated status
+        """
+        ux, uy = self.lattice.ux, self.lattice.uy
+        self.steps += steps
+        change = (self._absolute_change(ux, self._ux) +
+                  self._absolute_change(uy, self._uy))
+        speed = np.abs(ux).sum() + np.abs(uy).sum()
+        self.residual = change / speed if speed else 0.0
+        # the baseline of later checkpoints is the flow of this lattice
+        baseline, self.interpolated = not self.interpolated, False
+        if (not np.isfinite(self.residual) or
+                max(np.abs(ux).max(), np.abs(uy).max()) > RUNAWAY_SPEED):
+            self.status = 'diverged'
+        elif self.residual < self.tolerance and baseline:
+            self.status = 'converged'
+        elif self.steps >= self.max_steps:
+            self.status = 'budget'
+        return self.status
+
+    def cancel(self):
+        self.status = 'cancelled'
+
+    def __str__(self):
+        return '{0} after {1} steps (residual {2:.2e})'.format(
+            self.status, self.steps, self.residual)
+
+
+class Lattice(object):
+    """Owns the populations of one simulation and advances them in place
+
+    Attributes:
+      height (int): lattice rows
+      width (int): lattice columns
+      viscosity (float): fluid viscosity
+      u0 (float): initial and in-flow speed
+      populations (np.ndarray): (9, height, width) particle densities
+      rho, ux, uy (np.ndarray): macroscopic density and velocity
+      barrier (np.ndarray): (height, width) boolean solid cells
+      backend (object): advances the populations, see backends.py.
+                        None runs the numpy reference below.
+      dtype (np.dtype): precision of populations and fields, float32
+                        halves the memory traffic of a step
+      batch_shape (tuple): leading axes of the fields in front of
+                           (height, width), empty for a single lattice
+      tiles (Tiles): tiles a backend may skip or freeze, see tiles.py.
+                     Fields of skipped tiles keep their last values.
+    """
+    batch_shape = ()
+    tiles = None
+
+    def __init__(self, height=200, width=200, viscosity=0.02, u0=0.1,
+                 backend=None, dtype=np.float64):
+        super(Lattice, self).__init__()
+        self.backend = backend
+        self.dtype = np.dtype(dtype)
+        self.height = height
+        self.width = width
+        self.viscosity = viscosity
+        self.u0 = u0
+        # "relaxation" parameter
+        self.omega = 1 / (3 * viscosity + 0.5)
+
+        shape = self.batch_shape + (height, width)
+        self.populations = np.empty((9,) + shape, self.dtype)
+        # streaming writes here, then both buffers swap roles
+        self._streamed = np.empty_like(self.populations)
+        self.rho = np.empty(shape, self.dtype)
+        self.ux = np.empty(shape, self.dtype)
+        self.uy = np.empty(shape, self.dtype)
+        # scratch buffers for collide
+        self._omu215 = np.empty(shape, self.dtype)
+        self._eu = np.empty(shape, self.dtype)
+        self._feq = np.empty(shape, self.dtype)
+
+        self._stream_slices = []
+        for north, east in VELOCITIES:
+            pairs = []
+            for rows in _wrap_slices(north):
+                for cols in _wrap_slices(east):
+                    pairs.append(((Ellipsis, rows[0], cols[0]),
+                                  (Ellipsis, rows[1], cols[1])))
+            self._stream_slices.append(pairs)
+
+        self.inflow = equilibrium(1.0, u0, 0.0)
+        self.steps = 0
+        self.set_barrier(np.zeros(shape, bool))
+        self.reset()
+
+    def reset(self):
+        """Initialize all populations to steady rightward flow
+        """
+        for i, value in enumerate(self.inflow):
+            self.populations[i][...] = value
+        self.steps = 0
+        self.update_macroscopic()
+        if self.tiles is not None:
+            self.tiles.wake()
+
+    def warm_start(self, previous):
+        """Continues from the flow of a previous lattice of the same size
+
+        Cells whose barrier state changed in between start over at rest.
+
+        Attributes:
+          previous (Lattice): the simulation to take the populations from
+        """
+        if previous.populations.shape != self.populations.shape:
+            raise ValueError('cannot warm start a {0} lattice from {1}'
+                             .format(self.populations.shape,
+                                     previous.populations.shape))
+        self.populations[...] = previous.populations
+        self._rest(self.barrier != previous.barrier)
+
+    def refine_from(self, coarse):
+        """Starts from the interpolated flow of a lattice of another size
+
+        Cells that are solid on only one of the lattices start over at
+        rest.
+
+        Attributes:
+          coarse (Lattice): the simulation to take the populations from
+        """
+        shape = (self.height, self.width)
+        self.populations[...] = resample(coarse.populations, shape)
+        self._rest(self.barrier != (resample(coarse.barrier.astype(float),
+                                             shape) >= 0.5))
+
+    def _rest(self, cells):
+        """Puts the populations of some cells at rest
+        """
+        for i, value in enumerate(equilibrium(1.0, 0.0, 0.0)):
+            self.populations[i][cells] = value
+        self.update_macroscopic()
+        if self.tiles is not None:
+            self.tiles.wake()
+
+    def update_barrier(self, barrier):
+        """Changes the solid cells while the flow goes on, cells whose
+        state changed start over at rest
+
+        Attributes:
+          barrier (np.ndarray): (height, width) array, True where solid
+        """
+        previous = self.barrier
+        self.set_barrier(barrier)
+        self._rest(self.barrier != previous)
+
+    def set_barrier(self, barrier):
+        """Installs solid cells and the indices used for bounce-back
+
+        Attributes:
+          barrier (np.ndarray): (height, width) array, True where solid
+        """
+        self.barrier = np.array(barrier, dtype=bool)
+        shape = self.batch_shape + (self.height, self.width)
+        if self.barrier.shape != shape:
+            raise ValueError('barrier shape {0} does not match lattice {1}'
+                             .format(self.barrier.shape, shape))
+        # flat indices of the solid cells, and of the site just downstream
+        # of each of them per direction (in the same order), so bounce-back
+        # only touches cells next to barriers
+        self._bounce_from = np.flatnonzero(self.barrier)
+        columns = self._bounce_from % self.width
+        rows = self._bounce_from // self.width % self.height
+        # first cell of the lattice each solid cell belongs to
+        first = self._bounce_from - rows * self.width - columns
+        self._bounce_to = []
+        for north, east in VELOCITIES:
+            self._bounce_to.append(first +
+                                   (rows + north) % self.height * self.width +
+                                   (columns + east) % self.width)
+        if self.tiles is not None:
+            self.tiles.set_barrier(self.barrier)
+
+    def use_tiles(self, tiles):
+        """Lets backends that walk the lattice in tiles leave some out
+
+        Attributes:
+          tiles (Tiles): for a lattice of this size
+        """
+        self.tiles = tiles
+        tiles.set_barrier(self.barrier)
+
+    def stream(self):
+        """Move all particles by one step along their directions of motion
+        (periodic boundaries) and bounce them back from barriers.
+        """
+        src = self.populations
+        dst = self._streamed
+        for i, pairs in enumerate(self._stream_slices):
+            for to, frm in pairs:
+                dst[i][to] = src[i][frm]
+        self.swap_buffers()
+        self.bounce_back()
+
+    def bounce_back(self):
+        if not len(self._bounce_from):
+            return
+        f = self.populations
+        for direction, opposite in BOUNCE_BACK:
+            f[direction].put(self._bounce_to[direction],
+                             f[opposite].take(self._bounce_from))
+
+    def update_macroscopic(self):
+        f = self.populations
+        np.sum(f, axis=0, out=self.rho)
+        np.add(f[3], f[5], out=self.ux)
+        self.ux += f[6]
+        self.ux -= f[4]
+        self.ux -= f[7]
+        self.ux -= f[8]
+        self.ux /= self.rho
+        np.add(f[1], f[5], out=self.uy)
+        self.uy += f[7]
+        self.uy -= f[2]
+        self.uy -= f[6]
+        self.uy -= f[8]
+        self.uy /= self.rho
+
+    def collide(self):
+        """Collide particles within each cell to redistribute velocities
+        """
+        self.update_macroscopic()
+        f = self.populations
+        ux, uy, eu, feq = self.ux, self.uy, self._eu, self._feq
+        omega = self.omega
+        # "one minus u2 times 1.5"
+        omu215 = self._omu215
+        np.multiply(ux, ux, out=omu215)
+        np.multiply(uy, uy, out=eu)
+        omu215 += eu
+        omu215 *= -1.5
+        omu215 += 1
+        for i, (north, east) in enumerate(VELOCITIES):
+            # feq = w * rho * (omu215 + 3 * eu + 4.5 * eu ** 2)
+            if north == 0 and east == 0:
+                np.multiply(self.rho, omu215, out=feq)
+            else:
+                if east == 0:
+                    np.multiply(uy, north, out=eu)
+                else:
+                    np.multiply(ux, east, out=eu)
+                    if north == 1:
+                        eu += uy
+                    elif north == -1:
+                        eu -= uy
+                np.multiply(eu, 4.5, out=feq)
+                feq += 3
+                feq *= eu
+                feq += omu215
+                feq *= self.rho
+            feq *= omega * WEIGHTS[i]
+            f[i] *= 1 - omega
+            f[i] += feq
+        # force steady rightward flow at the west end
+        # (no need to set 0, N, and S components)
+        for i in INFLOW:
+            f[i][..., :1] = self.inflow[i]
+
+    def swap_buffers(self):
+        self.populations, self._streamed = self._streamed, self.populations
+
+    def step(self, steps=1):
+        if self.backend is not None:
+            self.backend.step(self, steps)
+        else:
+            for _ in range(steps):
+                self.stream()
+                self.collide()
+        self.steps += steps
+
+    def run_until_converged(self, tolerance, max_steps, check_every=20,
+                            interpolated=False):
+        """Steps until the flow is steady, blows up or max_steps ran out
+
+        Attributes:
+          interpolated (bool): the flow was interpolated from a lattice of
+                               another size, see Convergence
+
+        Returns:
+          (Convergence): status, steps run and final residual
+        """
+        convergence = Convergence(self, tolerance, max_steps, interpolated)
+        while convergence.status == 'running':
+            steps = min(check_every, max_steps - convergence.steps)
+            self.step(steps)
+            convergence.checkpoint(steps)
+        return convergence
+
+    def close(self):
+        """Releases resources held by the engine (nothing to do here)
+        """
+        pass
+
+    def curl(self):
+        """Curl of the macroscopic velocity field
+        """
+        return curl(self.ux, self.uy)
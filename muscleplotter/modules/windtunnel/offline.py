@@ -0,0 +1,216 @@
+"""Simulates a directory of sketches headless, one process per core.
+
+Wind fields for study materials are computed ahead of time instead of in
+the demo, without the pen, OSC or EMS stacks. Every input is simulated
+like a sketch of the demo (see windtunnelsimulator.py and the [Wind
+Tunnel] section of configuration/defaults.cfg) by a pool of worker
+processes, each running its lattice in-process.
+
+Inputs are
+  * images (.png, .jpg, .bmp, .gif), north up, dark pixels are solid.
+    Images of another size than the lattice are scaled to it.
+  * recorded strokes (.json), a list of strokes, each a list of [x, y]
+    pen positions in anoto pixels, or an object with such "strokes" and
+    the "area" [left, top, right, bottom] they were drawn in (the sketch
+    area of the demo by default).
+
+For every input <name> the output directory gets <name>.npz with the
+fields (ux, uy, rho, barrier), the stream function psi and the
+streamlines traced from the seed rows (seeds, and xs and ys padded with
+NaN after lengths points), optionally the curl with the streamlines as
+<name>.png and a movie of the simulation as <name>.mp4. summary.json
+lists how every simulation ended.
+
+Example:
+    $ python -m muscleplotter.modules.windtunnel.offline sketches/ \\
+          output/sketches --render
+"""
+from __future__ import division, print_function
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+import numpy as np
+from PIL import Image
+
+from windtunnelsimulator import WindSim, config
+from sketch import sketch_barrier, DILATE_RADIUS, ERODE_RADIUS
+from references import SKETCH_AREA
+from renderer import Renderer, colour_frame
+from streamlines import StreamFunction, trace_streamlines
+
+IMAGES = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+STROKES = ('.json',)
+# pixels per lattice cell of the renders
+SCALE = 4
+# image pixels darker than this are solid
+THRESHOLD = 128
+
+
+def find_inputs(directory):
+    """Sketch images and stroke files in a directory, sorted by name
+    """
+    return [os.path.join(directory, name)
+            for name in sorted(os.listdir(directory))
+            if os.path.splitext(name)[1].lower() in IMAGES + STROKES]
+
+
+def image_rasterizer(path):
+    """Function that scales a sketch image to the barrier of a lattice of a
+    given (height, width)
+    """
+    image = Image.open(path).convert('L')
+
+    def rasterize(shape):
+        height, width = shape
+        scaled = image
+        if image.size != (width, height):
+            scaled = image.resize((width, height), Image.BILINEAR)
+        # row 0 of the lattice is the south end
+        return (np.asarray(scaled) < THRESHOLD)[::-1]
+    return rasterize
+
+
+def strokes_rasterizer(path):
+    """Function that draws recorded strokes as the barrier of a lattice of
+    a given (height, width), like the demo does
+    """
+    with open(path) as strokes_file:
+        recording = json.load(strokes_file)
+    area = SKETCH_AREA
+    if isinstance(recording, dict):
+        area = recording.get('area', area)
+        recording = recording['strokes']
+    supersample = config.getint('Wind Tunnel', 'barrier_supersample')
+
+    def rasterize(shape):
+        return sketch_barrier(recording, area, shape, supersample,
+                              DILATE_RADIUS, ERODE_RADIUS)
+    return rasterize
+
+
+def rasterizer(path):
+    if os.path.splitext(path)[1].lower() in STROKES:
+        return strokes_rasterizer(path)
+    return image_rasterizer(path)
+
+
+def render(path, simulation, xs, ys):
+    """Saves the curl of the final flow with its streamlines, north up
+    """
+    image = colour_frame(simulation.curl(simulation.ux, simulation.uy),
+                         simulation.barrier, scale=SCALE)
+    points = ~np.isnan(xs)
+    rows = (WindSim.height - 1 - np.rint(ys[points])).astype(int)
+    columns = np.rint(xs[points]).astype(int)
+    image[rows * SCALE + SCALE // 2, columns * SCALE + SCALE // 2] = 255
+    Image.fromarray(image).save(path)
+
+
+def simulate_file(task):
+    """Simulates one input and saves its results, see main() for task
+
+    Returns:
+      (dict): input, how its simulation ended, steps and seconds, or the
+              error that stopped it
+    """
+    path, directory, seed_spacing, save_render, save_movie = task
+    name = os.path.splitext(os.path.basename(path))[0]
+    result = {'input': path, 'name': name}
+    start = time.time()
+    try:
+        simulation = WindSim(rasterizer(path))
+        movie = None
+        if save_movie:
+            movie = Renderer(os.path.join(directory, name + '.mp4'),
+                             WindSim.height, WindSim.width)
+        try:
+            convergence = simulation.run(movie)
+        finally:
+            if movie is not None:
+                movie.close()
+
+        seeds = np.arange(seed_spacing, WindSim.height - 1, seed_spacing)
+        stream_function = StreamFunction(simulation.ux, simulation.uy,
+                                         simulation.barrier)
+        xs, ys, lengths = trace_streamlines(simulation.ux, simulation.uy,
+                                            seeds, barrier=simulation.barrier)
+        np.savez_compressed(os.path.join(directory, name + '.npz'),
+                            ux=simulation.ux, uy=simulation.uy,
+                            rho=simulation.rho, barrier=simulation.barrier,
+                            psi=stream_function.psi, seeds=seeds,
+                            xs=xs, ys=ys, lengths=lengths)
+        if save_render:
+            render(os.path.join(directory, name + '.png'), simulation,
+                   xs, ys)
+        simulation.close()
+        result.update({'status': convergence.status,
+                       'steps': convergence.steps})
+    except Exception:
+        result.update({'status': 'error',
+                       'error': traceback.format_exc()})
+    result['seconds'] = time.time() - start
+    return result
+
+
+def _quiet_worker():
+    """Every pool process runs its lattice in-process and does not print
+    the barriers
+    """
+    WindSim.workers = 1
+    WindSim.DEBUG = False
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('inputs', help='directory of sketch images and '
+                                       'stroke files')
+    parser.add_argument('output', help='directory the results are saved to')
+    parser.add_argument('--processes', type=int, default=0,
+                        help='simulations at once, 0 uses every core')
+    parser.add_argument('--seed-spacing', type=int, default=5,
+                        help='lattice rows between streamline seeds')
+    parser.add_argument('--render', action='store_true',
+                        help='save the curl and streamlines as <name>.png')
+    parser.add_argument('--movie', action='store_true',
+                        help='save a movie as <name>.mp4 (needs ffmpeg)')
+    options = parser.parse_args(arguments)
+
+    inputs = find_inputs(options.inputs)
+    if not os.path.isdir(options.output):
+        os.makedirs(options.output)
+    tasks = [(path, options.output, options.seed_spacing, options.render,
+              options.movie) for path in inputs]
+    processes = options.processes or multiprocessing.cpu_count()
+    processes = max(1, min(processes, len(tasks)))
+
+    results = []
+    # a fresh process per input, so memory does not pile up
+    pool = multiprocessing.Pool(processes, _quiet_worker,
+                                maxtasksperchild=1)
+    try:
+        for result in pool.imap_unordered(simulate_file, tasks):
+            results.append(result)
+            print('[{0}/{1}] {name}: {status} after {seconds:.1f} s'
+                  .format(len(results), len(tasks), **result),
+                  file=sys.stderr)
+            if result['status'] == 'error':
+                print(result['error'], file=sys.stderr)
+    finally:
+        pool.close()
+        pool.join()
+
+    results.sort(key=lambda result: result['name'])
+    with open(os.path.join(options.output, 'summary.json'), 'w') as summary:
+        summary.write(json.dumps(results, indent=2, sort_keys=True,
+                                 separators=(',', ': ')) + '\n')
+    return int(any(result['status'] == 'error' for result in results))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""Runs one lattice across several processes.
+
+The lattice is split into horizontal strips, one per worker process. The
+populations, the macroscopic fields and the barrier live in shared memory,
+so every step a worker copies its strip plus HALO rows on either side,
+advances that block with an ordinary Lattice and writes its own rows back.
+Reading the neighbouring rows is the halo exchange: the halo is deep
+enough for streaming and bounce-back to be exact, so the result matches the
+single-process engine bit for bit.
+"""
+from __future__ import division
+
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+
+import numpy as np
+
+from lattice import Lattice
+from backends import get_backend
+
+# rows copied from each neighbouring strip. Streaming reaches one row,
+# bounce-back reads populations that were bounced back from the next one.
+HALO = 3
+
+
+def _shared_views(buffers, shape, dtype):
+    """numpy views of the shared populations, fields and barrier
+    """
+    populations = np.frombuffer(buffers[0], dtype).reshape((2, 9) + shape)
+    fields = np.frombuffer(buffers[1], dtype).reshape((3,) + shape)
+    barrier = np.frombuffer(buffers[2], dtype=np.uint8).reshape(shape)
+    return populations, fields, barrier
+
+
+def _strip_worker(connection, buffers, shape, rows, parameters, backend):
+    """Advances rows [start, end) of the shared lattice on request
+    """
+    viscosity, u0, dtype = parameters
+    populations, fields, barrier = _shared_views(buffers, shape, dtype)
+    height, width = shape
+    start, end = rows
+    gather = np.arange(start - HALO, end + HALO) % height
+    local = Lattice(len(gather), width, viscosity, u0, get_backend(backend),
+                    dtype)
+    inner = slice(HALO, -HALO)
+    while True:
+        message = connection.recv()
+        if message[0] == 'close':
+            break
+        elif message[0] == 'barrier':
+            strip_barrier = barrier[gather].astype(bool)
+            # the block is periodic, so bounce-back of the outermost rows
+            # would wrap around onto the other end of the block. Those
+            # rows never reach the inner ones, so they can stay fluid.
+            strip_barrier[0] = False
+            strip_barrier[-1] = False
+            local.set_barrier(strip_barrier)
+        elif message[0] == 'step':
+            source = message[1]
+            np.take(populations[source], gather, axis=1,
+                    out=local.populations)
+            local.step(1)
+            populations[1 - source][:, start:end] = \
+                local.populations[:, inner]
+            fields[0, start:end] = local.rho[inner]
+            fields[1, start:end] = local.ux[inner]
+            fields[2, start:end] = local.uy[inner]
+        connection.send(True)
+    connection.close()
+
+
+def split_rows(height, workers):
+    """Splits height rows into (start, end) strips of (nearly) equal size
+    """
+    edges = np.linspace(0, height, workers + 1).round().astype(int)
+    return [(edges[i], edges[i + 1]) for i in range(workers)]
+
+
+class ParallelLattice(Lattice):
+    """A Lattice whose steps are computed by a pool of worker processes
+
+    Attributes:
+      workers (int): number of worker processes (strips),
+                     0 uses one per cpu core
+      backend (str): name of the backend every worker uses
+    """
+    def __init__(self, height=200, width=200, viscosity=0.02, u0=0.1,
+                 backend='numpy', workers=0, dtype=np.float64):
+        self._connections = []
+        self._processes = []
+        super(ParallelLattice, self).__init__(height, width, viscosity, u0,
+                                              dtype=dtype)
+        if workers < 1:
+            workers = multiprocessing.cpu_count()
+        # every strip needs rows of its own next to the halo
+        workers = max(1, min(workers, height // HALO))
+
+        shape = (height, width)
+        cells = height * width
+        typecode = self.dtype.char
+        self._buffers = (RawArray(typecode, 2 * 9 * cells),
+                         RawArray(typecode, 3 * cells),
+                         RawArray('B', cells))
+        populations, fields, barrier = _shared_views(self._buffers, shape,
+                                                     self.dtype)
+        populations[0] = self.populations
+        self.populations, self._streamed = populations[0], populations[1]
+        self._source = 0
+        self.rho, self.ux, self.uy = fields[0], fields[1], fields[2]
+        self.update_macroscopic()
+        self._shared_barrier = barrier
+        barrier[:] = self.barrier
+
+        for rows in split_rows(height, workers):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_strip_worker,
+                args=(child, self._buffers, shape, rows,
+                      (viscosity, u0, self.dtype), backend))
+            process.daemon = True
+            process.start()
+            self._connections.append(parent)
+            self._processes.append(process)
+        self._broadcast(('barrier',))
+
+    @property
+    def workers(self):
+        return len(self._processes)
+
+    def _broadcast(self, message):
+        for connection in self._connections:
+            connection.send(message)
+        for connection in self._connections:
+            connection.recv()
+
+    def set_barrier(self, barrier):
+        super(ParallelLattice, self).set_barrier(barrier)
+        if self._connections:
+            self._shared_barrier[:] = self.barrier
+            self._broadcast(('barrier',))
+
+    def swap_buffers(self):
+        super(ParallelLattice, self).swap_buffers()
+        self._source = 1 - self._source
+
+    def step(self, steps=1):
+        for _ in range(steps):
+            self._broadcast(('step', self._source))
+            self.swap_buffers()
+        self.steps += steps
+
+    def close(self):
+        for connection in self._connections:
+            connection.send(('close',))
+        for process in self._processes:
+            process.join()
+        self._connections = []
+        self._processes = []
@@ -0,0 +1,90 @@
+"""Reference sketches to check the wind tunnel against.
+
+Every sketch is a list of strokes in anoto pixels, drawn in the sketch
+area of the wind tunnel demo, so that engine options can be compared on
+the shapes users actually draw.
+"""
+from __future__ import division
+
+import numpy as np
+
+from sketch import sketch_barrier, DILATE_RADIUS, ERODE_RADIUS
+from streamlines import trace_streamlines
+
+# left, top, right and bottom edge of the demo's sketch area
+SKETCH_AREA = (1700, 1000, 6000, 5300)
+
+
+def _ellipse(x, y, width, height, points=200):
+    angles = np.linspace(0, 2 * np.pi, points)
+    return np.column_stack([x + width / 2 * np.cos(angles),
+                            y + height / 2 * np.sin(angles)])
+
+
+def _line(start, end, points=50):
+    return np.column_stack([np.linspace(start[0], end[0], points),
+                            np.linspace(start[1], end[1], points)])
+
+
+def _hatch(left, top, right, bottom, spacing=40):
+    # zig-zags from top to bottom, close enough to fill the box
+    rows = np.arange(top, bottom + 1, spacing)
+    columns = np.where(np.arange(len(rows)) % 2, right, left)
+    return np.column_stack([columns, rows])
+
+
+SKETCHES = {
+    # a round obstacle in the middle of the tunnel
+    'cylinder': [_ellipse(3400, 3150, 700, 700)],
+    # a tilted plate, the flow is deflected downwards
+    'plate': [_line((2800, 2700), (4200, 3300))],
+    # a closed wing profile and a separate stroke above it
+    'wing': [_ellipse(3600, 3600, 1800, 400),
+             _line((3000, 2000), (4000, 1900))],
+    # a filled block, most of the lattice behind it is solid
+    'block': [_hatch(2800, 2200, 4800, 4200)],
+}
+
+
+def reference_barrier(name, shape, supersample=2):
+    """Barrier of a reference sketch, rasterized like the dispatcher does
+
+    Attributes:
+      name (str): key of SKETCHES
+      shape ((int, int)): (height, width) of the lattice
+    """
+    return sketch_barrier(SKETCHES[name], SKETCH_AREA, shape, supersample,
+                          DILATE_RADIUS, ERODE_RADIUS)
+
+
+def streamline_deviation(flow, reference, start_y, barrier=None):
+    """Largest vertical distance between the streamlines of two flows
+
+    Lines are compared column by column as far as both of them reach.
+
+    Attributes:
+      flow, reference ((np.ndarray, np.ndarray)): ux and uy of both flows
+      start_y ([float]): seed rows at the tunnel entry
+      barrier (np.ndarray): solid cells that end a line
+
+    Returns:
+      (float): deviation in anoto pixels
+    """
+    width = reference[0].shape[1]
+    # anoto pixels per lattice cell
+    cell = (SKETCH_AREA[2] - SKETCH_AREA[0]) / width
+    xs, ys, lengths = trace_streamlines(flow[0], flow[1], start_y,
+                                        barrier=barrier)
+    ref_xs, ref_ys, ref_lengths = trace_streamlines(
+        reference[0], reference[1], start_y, barrier=barrier)
+    deviation = 0.0
+    for i in range(len(lengths)):
+        x, y = xs[i, :lengths[i]], ys[i, :lengths[i]]
+        ref_x, ref_y = ref_xs[i, :ref_lengths[i]], ref_ys[i, :ref_lengths[i]]
+        columns = np.arange(0, min(x[-1], ref_x[-1]))
+        if not len(columns):
+            continue
+        difference = (np.interp(columns, x, y) -
+                      np.interp(columns, ref_x, ref_y))
+        deviation = max(deviation, np.abs(difference).max())
+    return deviation * cell
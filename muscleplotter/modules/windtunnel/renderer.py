@@ -0,0 +1,156 @@
+"""Turns simulation snapshots into a movie.
+
+Rendering is optional and kept apart from the physics: the curl of every
+snapshot is mapped to colours through a lookup table and the raw frames
+are piped to ffmpeg from a background thread, so encoding overlaps with
+the next simulation steps. matplotlib is only used for its colormaps when
+it is installed.
+"""
+from __future__ import division, print_function
+
+import subprocess
+import threading
+
+import numpy as np
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+try:
+    import matplotlib.cm
+except ImportError:
+    matplotlib = None
+
+# frames waiting for the encoder before the simulation has to wait
+QUEUE_SIZE = 16
+
+
+def _jet(values):
+    """matplotlib's jet colormap for values in [0, 1], as (n, 3) floats
+    """
+    return np.clip(np.stack([1.5 - np.abs(4 * values - 3),
+                             1.5 - np.abs(4 * values - 2),
+                             1.5 - np.abs(4 * values - 1)], axis=-1), 0, 1)
+
+
+def colormap_lut(name='jet', size=256):
+    """Lookup table of a colormap
+
+    Attributes:
+      name (str): matplotlib colormap, only jet works without matplotlib
+      size (int): number of colours
+
+    Returns:
+      (np.ndarray): (size, 3) uint8 rgb colours
+    """
+    values = np.linspace(0, 1, size)
+    if matplotlib is not None:
+        colours = matplotlib.cm.get_cmap(name)(values)[:, :3]
+    elif name == 'jet':
+        colours = _jet(values)
+    else:
+        raise ValueError('colormap "{0}" needs matplotlib'.format(name))
+    return (colours * 255).round().astype(np.uint8)
+
+
+def colour_frame(curl, barrier=None, lut=None, limits=(-0.1, 0.1), scale=1):
+    """Colours a curl field, barrier cells are black
+
+    Attributes:
+      curl (np.ndarray): (height, width) curl of the flow
+      barrier (np.ndarray): (height, width) solid cells
+      lut (np.ndarray): colormap lookup table, jet by default
+      limits ((float, float)): curl mapped to the ends of the colormap
+      scale (int): pixels per lattice cell
+
+    Returns:
+      (np.ndarray): (height * scale, width * scale, 3) uint8 image, north up
+    """
+    if lut is None:
+        lut = colormap_lut()
+    low, high = limits
+    last = len(lut) - 1
+    index = np.clip((curl - low) * (last / (high - low)), 0, last)
+    image = lut[np.rint(index).astype(np.intp)]
+    if barrier is not None:
+        image[barrier] = 0
+    # row 0 is the south end of the tunnel
+    image = image[::-1]
+    if scale > 1:
+        image = image.repeat(scale, 0).repeat(scale, 1)
+    return image
+
+
+class Renderer(object):
+    """Encodes the curl of simulation snapshots into a movie with ffmpeg
+
+    Attributes:
+      path (str): movie file to write
+      height, width (int): lattice size
+      fps (int): frames per second of the movie
+      scale (int): pixels per lattice cell
+      limits ((float, float)): curl mapped to the ends of the colormap
+      colormap (str): name of the colormap
+    """
+    def __init__(self, path, height, width, fps=15, scale=4,
+                 limits=(-0.1, 0.1), colormap='jet'):
+        super(Renderer, self).__init__()
+        self.path = path
+        self.scale = scale
+        self.limits = limits
+        self.lut = colormap_lut(colormap)
+        self.frames = 0
+        size = '{0}x{1}'.format(width * scale, height * scale)
+        command = ['ffmpeg', '-y', '-loglevel', 'error',
+                   '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', size,
+                   '-r', str(fps), '-i', '-',
+                   '-pix_fmt', 'yuv420p', '-b:v', '1800k', path]
+        try:
+            self._encoder = subprocess.Popen(command, stdin=subprocess.PIPE)
+        except OSError:
+            print('ffmpeg is not installed, not rendering ' + path)
+            self._encoder = None
+            return
+        self._queue = queue.Queue(QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._encode)
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def active(self):
+        return self._encoder is not None
+
+    def frame(self, curl, barrier=None):
+        return colour_frame(curl, barrier, self.lut, self.limits, self.scale)
+
+    def add(self, snapshot):
+        """Queues the frame of a snapshot for encoding
+        """
+        if not self.active:
+            return
+        self._queue.put(self.frame(snapshot.curl(), snapshot.barrier))
+        self.frames += 1
+
+    def _encode(self):
+        while True:
+            image = self._queue.get()
+            if image is None:
+                break
+            try:
+                self._encoder.stdin.write(image.tobytes())
+            except IOError:
+                # ffmpeg quit, drain the queue so the simulation goes on
+                pass
+
+    def close(self):
+        """Waits for the queued frames to be encoded and finishes the movie
+        """
+        if not self.active:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._encoder.stdin.close()
+        self._encoder.wait()
+        self._encoder = None
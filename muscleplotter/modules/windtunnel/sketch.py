@@ -0,0 +1,94 @@
+"""Turns pen strokes into the barrier of a wind tunnel simulation.
+
+Strokes are drawn as connected line segments straight onto a grid a small
+multiple of the lattice resolution, thickened with binary morphology and
+reduced to lattice cells. Only cells that are fully covered by the
+thickened strokes become solid.
+"""
+from __future__ import division
+
+import numpy as np
+from scipy import ndimage
+
+# pixels are squares, morphology grows and shrinks by whole squares
+SQUARE = np.ones((3, 3), bool)
+# strokes are thickened by this much and thinned again (closing small
+# gaps between them), in anoto pixels
+DILATE_RADIUS = 36
+ERODE_RADIUS = 10
+
+
+def rasterize_strokes(strokes, shape):
+    """Draws strokes as connected line segments
+
+    Attributes:
+      strokes ([np.ndarray]): one (points, 2) array of (column, row)
+                              positions per stroke, in grid cells
+      shape ((int, int)): (rows, columns) of the grid
+
+    Returns:
+      (np.ndarray): boolean grid, True on the strokes
+    """
+    grid = np.zeros(shape, bool)
+    for stroke in strokes:
+        stroke = np.asarray(stroke, dtype=float).reshape(-1, 2)
+        if not len(stroke):
+            continue
+        if len(stroke) == 1:
+            stroke = np.vstack([stroke, stroke])
+        start = stroke[:-1]
+        delta = stroke[1:] - start
+        # one sample per cell along the longer axis of every segment
+        samples = np.ceil(np.abs(delta).max(axis=1)).astype(int) + 1
+        segment = np.repeat(np.arange(len(start)), samples)
+        first = np.repeat(np.cumsum(samples) - samples, samples)
+        fraction = ((np.arange(len(segment)) - first) /
+                    np.repeat(np.maximum(samples - 1, 1), samples))
+        points = start[segment] + delta[segment] * fraction[:, np.newaxis]
+        columns, rows = np.rint(points).astype(int).T
+        inside = ((rows >= 0) & (rows < shape[0]) &
+                  (columns >= 0) & (columns < shape[1]))
+        grid[rows[inside], columns[inside]] = True
+    return grid
+
+
+def sketch_barrier(strokes, area, shape, supersample=1,
+                   dilate_radius=0, erode_radius=0):
+    """Barrier of a lattice from strokes drawn in the sketch area
+
+    Attributes:
+      strokes ([[(float, float)]]): pen positions of every stroke
+      area ((float, float, float, float)): left, top, right and bottom
+                                           edge of the sketch area
+      shape ((int, int)): (height, width) of the lattice
+      supersample (int): grid pixels per lattice cell and axis
+      dilate_radius (float): strokes are thickened by this much ...
+      erode_radius (float): ... and thinned by this much again, both in
+                            the units of the pen positions
+
+    Returns:
+      (np.ndarray): (height, width) boolean barrier, row 0 is the bottom
+                    of the sketch area
+    """
+    left, top, right, bottom = area
+    height, width = shape
+    rows, columns = height * supersample, width * supersample
+    # pen units per grid pixel
+    pixel = (right - left) / columns
+    grid_strokes = []
+    for stroke in strokes:
+        stroke = np.asarray(stroke, dtype=float).reshape(-1, 2)
+        grid_strokes.append(np.column_stack([
+            (stroke[:, 0] - left) * (columns - 1) / (right - left),
+            (bottom - stroke[:, 1]) * (rows - 1) / (bottom - top)]))
+    grid = rasterize_strokes(grid_strokes, (rows, columns))
+
+    dilations = int(round(dilate_radius / pixel))
+    erosions = int(round(erode_radius / pixel))
+    if dilations:
+        grid = ndimage.binary_dilation(grid, SQUARE, dilations)
+    if erosions:
+        grid = ndimage.binary_erosion(grid, SQUARE, erosions,
+                                      border_value=1)
+    return grid.reshape(height, supersample,
+                        width, supersample).all(axis=(1, 3))
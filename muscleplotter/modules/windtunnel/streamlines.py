@@ -0,0 +1,207 @@
+"""Traces streamlines through a simulated velocity field.
+
+All seeds advance together as numpy arrays. Velocities are bilinearly
+interpolated between lattice cells and positions are integrated with the
+midpoint (rk2) or the classic Runge-Kutta (rk4) method along the flow
+direction. Every seed stops on its own once it leaves the lattice, runs
+into a barrier or is carried backwards against the tunnel flow.
+
+StreamFunction integrates a finished field once into its stream function,
+after which a streamline is an iso-contour lookup rather than a trace.
+"""
+from __future__ import division
+
+import numpy as np
+
+# distance travelled per step, in lattice cells
+STEP = 0.5
+MAX_STEPS = 10000
+
+
+def interpolate(field, x, y):
+    """Bilinear interpolation of field[y, x] at fractional positions
+
+    Attributes:
+      field (np.ndarray): (height, width) values on the lattice
+      x, y (np.ndarray): column and row positions, clipped to the lattice
+    """
+    height, width = field.shape
+    x = np.clip(x, 0, width - 1)
+    y = np.clip(y, 0, height - 1)
+    # kept in the precision of the positions
+    x0 = np.minimum(np.floor(x), width - 2)
+    y0 = np.minimum(np.floor(y), height - 2)
+    fx = x - x0
+    fy = y - y0
+    x0 = x0.astype(int)
+    y0 = y0.astype(int)
+    bottom = field[y0, x0] * (1 - fx) + field[y0, x0 + 1] * fx
+    top = field[y0 + 1, x0] * (1 - fx) + field[y0 + 1, x0 + 1] * fx
+    return bottom * (1 - fy) + top * fy
+
+
+def _direction(ux, uy, x, y):
+    """Unit flow direction at the given positions
+
+    Returns:
+      (dx, dy, moving): moving is False where the flow stands still
+                        or points back upstream
+    """
+    vx = interpolate(ux, x, y)
+    vy = interpolate(uy, x, y)
+    speed = np.hypot(vx, vy)
+    moving = (speed > 0) & (vx >= 0)
+    speed[~moving] = 1
+    return vx / speed, vy / speed, moving
+
+
+def _advance(ux, uy, x, y, step, method):
+    dx1, dy1, moving = _direction(ux, uy, x, y)
+    dx2, dy2, _ = _direction(ux, uy, x + step / 2 * dx1, y + step / 2 * dy1)
+    if method == 'rk2':
+        return x + step * dx2, y + step * dy2, moving
+    dx3, dy3, _ = _direction(ux, uy, x + step / 2 * dx2, y + step / 2 * dy2)
+    dx4, dy4, _ = _direction(ux, uy, x + step * dx3, y + step * dy3)
+    return (x + step / 6 * (dx1 + 2 * dx2 + 2 * dx3 + dx4),
+            y + step / 6 * (dy1 + 2 * dy2 + 2 * dy3 + dy4),
+            moving)
+
+
+def trace_streamlines(ux, uy, start_y, start_x=0, barrier=None,
+                      step=STEP, max_steps=MAX_STEPS, method='rk2'):
+    """Follows the flow from every seed at once
+
+    Attributes:
+      ux, uy (np.ndarray): (height, width) velocity field
+      start_y ([float]): seed rows
+      start_x (float or [float]): seed columns, the tunnel entry by default
+      barrier (np.ndarray): (height, width) solid cells that end a line
+      step (float): distance travelled per step, in lattice cells
+      max_steps (int): longest streamline (in steps)
+      method (str): 'rk2' or 'rk4'
+
+    Returns:
+      (xs, ys, lengths): xs and ys are (seeds, longest) arrays padded with
+                         NaN after lengths[i] points of streamline i
+    """
+    if method not in ('rk2', 'rk4'):
+        raise ValueError('Unknown integration method "{0}"'.format(method))
+    height, width = ux.shape
+    # positions in the precision of the field
+    y = np.array(start_y, dtype=ux.dtype).ravel()
+    x = np.empty_like(y)
+    x[:] = start_x
+    lengths = np.ones(len(y), dtype=int)
+    xs = [x.copy()]
+    ys = [y.copy()]
+    active = np.arange(len(y))
+    for _ in range(max_steps):
+        if not len(active):
+            break
+        new_x, new_y, keep = _advance(ux, uy, x[active], y[active],
+                                      step, method)
+        keep &= ((new_x >= 0) & (new_x <= width - 1) &
+                 (new_y >= 0) & (new_y <= height - 1))
+        if barrier is not None:
+            rows = np.rint(new_y[keep]).astype(int)
+            columns = np.rint(new_x[keep]).astype(int)
+            keep[keep] = ~barrier[rows, columns]
+        active = active[keep]
+        x[active] = new_x[keep]
+        y[active] = new_y[keep]
+        lengths[active] += 1
+        row_x = np.full(len(y), np.nan, y.dtype)
+        row_y = np.full(len(y), np.nan, y.dtype)
+        row_x[active] = x[active]
+        row_y[active] = y[active]
+        xs.append(row_x)
+        ys.append(row_y)
+    longest = lengths.max() if len(lengths) else 0
+    return (np.array(xs).T[:, :longest].copy(),
+            np.array(ys).T[:, :longest].copy(),
+            lengths)
+
+
+def _cumulative_trapezoid(values, axis):
+    """Running trapezoid integral along axis, starting at zero
+    """
+    values = np.swapaxes(values, axis, 0)
+    integral = np.zeros_like(values)
+    np.cumsum((values[1:] + values[:-1]) / 2, axis=0, out=integral[1:])
+    return np.swapaxes(integral, 0, axis)
+
+
+def stream_function(ux, uy):
+    """Integrates the stream function psi of a velocity field
+
+    psi grows with ux along the rows (ux = dpsi/dy) and shrinks with uy
+    along the columns (uy = -dpsi/dx). It is integrated along two paths,
+    up the entry column then east along the rows, and east along the
+    first row then up the columns, and the two results are averaged.
+
+    Returns:
+      (np.ndarray): (height, width) psi, zero at the south west corner
+    """
+    up_first = (_cumulative_trapezoid(ux[:, :1], 0) -
+                _cumulative_trapezoid(uy, 1))
+    east_first = (_cumulative_trapezoid(-uy[:1, :], 1) +
+                  _cumulative_trapezoid(ux, 0))
+    return (up_first + east_first) / 2
+
+
+class StreamFunction(object):
+    """Streamlines of a finished simulation as iso-contours of psi
+
+    Integrating the field once makes every later request a lookup: the
+    streamline entering at a given row follows the psi level of that row
+    from column to column.
+
+    Attributes:
+      psi (np.ndarray): (height, width) stream function
+      barrier (np.ndarray): solid cells, contours inside them are ignored
+      psi: the stream function of ux and uy if it is known already
+    """
+    def __init__(self, ux, uy, barrier=None, psi=None):
+        super(StreamFunction, self).__init__()
+        if psi is None:
+            psi = stream_function(ux, uy)
+        self.psi = psi
+        self.barrier = barrier
+
+    def streamline(self, start_y):
+        """Streamline entering the tunnel at row start_y
+
+        Where the level is crossed several times in a column (eddies), the
+        crossing closest to the previous column continues the line.
+
+        Returns:
+          (x, y): one point per column, up to where the line leaves the
+                  lattice or no longer finds its level
+        """
+        height, width = self.psi.shape
+        level = interpolate(self.psi, np.array([0.0]),
+                            np.array([float(start_y)]))[0]
+        # crossings of every column at once, transposed so that they come
+        # out sorted by column
+        offset = (self.psi - level).T
+        below = offset[:, :-1]
+        above = offset[:, 1:]
+        crossed = (below <= 0) & (above > 0) | (below > 0) & (above <= 0)
+        if self.barrier is not None:
+            crossed &= ~(self.barrier[:-1] & self.barrier[1:]).T
+        columns, rows = np.nonzero(crossed)
+        low = below[columns, rows]
+        heights = rows + low / (low - above[columns, rows])
+        bounds = np.searchsorted(columns, np.arange(width + 1))
+
+        y = np.empty(width)
+        y[0] = start_y
+        end = width
+        for column in range(1, width):
+            candidates = heights[bounds[column]:bounds[column + 1]]
+            if not len(candidates):
+                end = column
+                break
+            y[column] = candidates[np.argmin(np.abs(candidates -
+                                                    y[column - 1]))]
+        return np.arange(end, dtype=float), y[:end]
@@ -1,11 +1,56 @@
-from time import clock
-import matplotlib.animation as anim
-import matplotlib.pyplot as plt
-import matplotlib.image as mpimg
+import time
 import numpy as np
-import scipy.misc
 from sys import argv
 import os
+import sys
+
+from lattice import Lattice, Convergence, curl, resample
+from backends import get_backend
+from parallel import ParallelLattice
+from streamlines import trace_streamlines
+from renderer import Renderer
+from cache import flow_key
+from tiles import Tiles
+
+# matplotlib is only needed for the debug plots and to load data/load.png
+try:
+    import matplotlib.pyplot as plt
+    import matplotlib.image as mpimg
+except ImportError:
+    plt = None
+    mpimg = None
+
+if (sys.version_info < (3, 0)):
+    import ConfigParser
+    config = ConfigParser.ConfigParser()
+else:
+    import configparser
+    config = configparser.ConfigParser()
+config.read('configuration/defaults.cfg')
+
+
+class Snapshot(object):
+    """Copy of the flow at one point of a simulation
+
+    Attributes:
+      steps (int): steps run so far
+      status (str): convergence status, see lattice.Convergence
+      residual (float): change of the flow since the previous checkpoint
+      ux, uy, rho (np.ndarray): macroscopic velocity and density
+      barrier (np.ndarray): solid cells
+    """
+    def __init__(self, lattice, convergence):
+        super(Snapshot, self).__init__()
+        self.steps = convergence.steps
+        self.status = convergence.status
+        self.residual = convergence.residual
+        self.ux = lattice.ux.copy()
+        self.uy = lattice.uy.copy()
+        self.rho = lattice.rho.copy()
+        self.barrier = lattice.barrier
+
+    def curl(self):
+        return curl(self.ux, self.uy)
 
 
 class WindSim(object):
@@ -18,353 +63,407 @@ class WindSim(object):
     DEBUG = True
     #load images as RGB rather than B/W
     RGB_MODE = False
-    #save all animation frames
-    save = True
+    #save a movie (mp4) and the streamline plots below
+    RENDER = config.getboolean('Wind Tunnel', 'render')
     #save a streamlot from matplotlib
     PLOT_STREAMLINES = True
-    #save animation frames as a movie (mp4)
-    SAVE_MOVIE = True
     #save individual streamlines from user's position
     PLOT_INDIVIDUAL_STREAMLINES = True
     #plots streamlines at regular intervales
     PLOT_CUSTOM_STREAMLINES = True
-    #steps
-    step_range = 20
+    #steps between convergence checks (and movie frames)
+    step_range = config.getint('Wind Tunnel', 'check_every')
+    #stop once the flow changes less than this between frames
+    tolerance = config.getfloat('Wind Tunnel', 'tolerance')
+    #step budget
+    max_steps = config.getint('Wind Tunnel', 'max_steps')
 
     # lattice height
-    height = 200  
+    height = config.getint('Wind Tunnel', 'height')
     # lattice width
-    width = 200
+    width = config.getint('Wind Tunnel', 'width')
+    # float64, or float32 for half the memory traffic per step
+    dtype = np.dtype(config.get('Wind Tunnel', 'precision'))
+    # coarser lattices (each half the size) the flow is relaxed on first
+    coarse_levels = config.getint('Wind Tunnel', 'coarse_levels')
+    # numpy, numexpr or numba
+    backend = config.get('Wind Tunnel', 'backend')
+    # processes the lattice is split across, 1 runs in-process
+    workers = config.getint('Wind Tunnel', 'workers')
+    # tiles of solid cells are skipped by the numba backend, 0 disables
+    tile_size = config.getint('Wind Tunnel', 'tile_size')
+    # tiles whose flow changes less than this between full steps are only
+    # updated every quiescent_every steps, 0 disables
+    quiescent_tolerance = config.getfloat('Wind Tunnel',
+                                          'quiescent_tolerance')
+    quiescent_every = config.getint('Wind Tunnel', 'quiescent_every')
     # fluid viscosity
-    viscosity = 0.02  
-    # "relaxation" parameter
-    omega = 1 / (3 * viscosity + 0.5)  
+    viscosity = 0.02
     # initial and in-flow speed
-    u0 = 0.1  
-    # abbreviations for lattice-Boltzmann weight factors
-    four9ths = 4.0 / 9.0
-    one9th = 1.0 / 9.0
-    one36th = 1.0 / 36.0
+    u0 = 0.1
     # set to True if performance data is desired
     performanceData = True
 
-    # Initialize all the arrays to steady rightward flow:
-    # particle densities along 9 directions
-    n0 = four9ths * (np.ones((height, width)) - 1.5 * u0**2)
-    nN = one9th * (np.ones((height, width)) - 1.5 * u0**2)
-    nS = one9th * (np.ones((height, width)) - 1.5 * u0**2)
-    nE = one9th * (np.ones((height, width)) +
-                   3 * u0 + 4.5 * u0**2 - 1.5 * u0**2)
-    nW = one9th * (np.ones((height, width)) -
-                   3 * u0 + 4.5 * u0**2 - 1.5 * u0**2)
-    nNE = one36th * (np.ones((height, width)) +
-                     3 * u0 + 4.5 * u0**2 - 1.5 * u0**2)
-    nSE = one36th * (np.ones((height, width)) +
-                     3 * u0 + 4.5 * u0**2 - 1.5 * u0**2)
-    nNW = one36th * (np.ones((height, width)) -
-                     3 * u0 + 4.5 * u0**2 - 1.5 * u0**2)
-    nSW = one36th * (np.ones((height, width)) -
-                     3 * u0 + 4.5 * u0**2 - 1.5 * u0**2)
-    # macroscopic density
-    rho = (n0 + nN + nS +
-           nE + nW + nNE +
-           nSE + nNW + nSW)
-    # macroscopic x velocity
-    ux = (nE + nNE + nSE -
-          nW - nNW - nSW) / rho
-    # macroscopic y velocity
-    uy = (nN + nNE + nNW -
-          nS - nSE - nSW) / rho
-
-    # Initialize barriers:
-    barrier = np.zeros((height, width), bool)
     full_path = os.getcwd() + "/muscleplotter/modules/windtunnel/"
 
-    def __init__(self, image=None):
+    def __init__(self, barrier=None, previous=None, relaxed=None):
+        """Sets up a simulation around a barrier
+
+        Attributes:
+          barrier (np.ndarray): (height, width) boolean solid cells, row 0
+                                is the south end. If None the barrier is
+                                loaded from data/load.png (black pixels).
+                                Can also be a function that rasterizes the
+                                barrier for a given (height, width), which
+                                gives sharper coarse levels.
+          previous (WindSim): an earlier simulation of the same tunnel to
+                              continue from instead of uniform flow
+          relaxed (Lattice): flow around (almost) this barrier relaxed
+                             already, e.g. while it was drawn, at full
+                             size or on the coarsest level. Takes
+                             precedence over previous: refined from the
+                             relaxed level, the full-size lattice
+                             converges in a few checkpoints, from the
+                             flow of the previous sketch (or a mix of
+                             both) it takes several times as many.
+        """
         super(WindSim, self).__init__()
-
-        if image:
-            (width, height) = image.size
-            imageData = np.array(image)
-
-            x = 0
-            y = 0
-            for y in range(height):
-                for x in range(width):
-                    if imageData[x][y] == 0:
-                        WindSim.barrier[x, y] = True
-                    else:
-                        WindSim.barrier[x, y] = False
-                    x += 1
-                y += 1
-
+        if WindSim.workers == 1:
+            self.lattice = Lattice(WindSim.height, WindSim.width,
+                                   WindSim.viscosity, WindSim.u0,
+                                   get_backend(WindSim.backend), WindSim.dtype)
+            WindSim.use_tiles(self.lattice)
         else:
-
-            # load the WindSim.barrier as an image file
+            self.lattice = ParallelLattice(WindSim.height, WindSim.width,
+                                           WindSim.viscosity, WindSim.u0,
+                                           WindSim.backend, WindSim.workers,
+                                           WindSim.dtype)
+        self.rasterize = None
+        if callable(barrier):
+            self.rasterize = barrier
+            barrier = barrier((WindSim.height, WindSim.width))
+        elif barrier is None:
+            # load the barrier as an image file
             if WindSim.RGB_MODE:
                 loaded_img = self.rgb2gray(mpimg.imread(
                     WindSim.full_path + "data/" + 'load.png', bool))
             else:
                 loaded_img = mpimg.imread(
                     WindSim.full_path + "data/" + 'load.png', bool)
-
-            barrier_img = loaded_img
-            # the img is png so i gotta go pixel per pixel
-            # and invert the colors to True/False
             if WindSim.DEBUG:
-                print(barrier_img)
-                print("img" + str(len(barrier_img)))
-
-            x = 0
-            y = 0
-            for y in range(WindSim.height):
-                for x in range(WindSim.width):
-                    if barrier_img[y, x] == 0:
-                        WindSim.barrier[y, x] = True
-                    else:
-                        WindSim.barrier[y, x] = False
-                    x += 1
-                y += 1
-
-        # scipy.misc.imsave('barierImage.png', WindSim.barrier)
+                print(loaded_img)
+                print("img" + str(len(loaded_img)))
+            barrier = loaded_img == 0
+
+        self.lattice.set_barrier(barrier)
+        # coarse levels still to relax before the first step
+        self.levels = WindSim.coarse_levels
+        self.relaxed = None
+        # started from uniform flow, the flow depends on the barrier and
+        # the settings alone and may be cached
+        self.cold = True
+        if relaxed is not None:
+            self.cold = False
+            if relaxed.barrier.shape == self.barrier.shape:
+                self.lattice.warm_start(relaxed)
+                self.levels = 0
+            else:
+                # coarse_to_fine() picks it up at its level
+                self.relaxed = relaxed
+        elif previous is not None:
+            if previous.convergence.status == 'diverged':
+                print("Previous simulation diverged, starting cold")
+            else:
+                self.lattice.warm_start(previous.lattice)
+                self.levels = 0
+                self.cold = False
 
         if WindSim.DEBUG:
-            print("WindSim.barrier definitions")
-            print("raw_len:" + str(len(WindSim.barrier)))
+            print("barrier definitions")
+            print("raw_len:" + str(len(self.barrier)))
             print("WindSim.width:" + str(WindSim.width))
             print("WindSim.height:" + str(WindSim.height))
-            print("col_l:" + str(len(WindSim.barrier) / WindSim.height))
-            print(WindSim.barrier)
-
-        # sites just north of barriers
-        self.barrierN = np.roll(WindSim.barrier, 1, axis=0)
-        # sites just south of barriers
-        self.barrierS = np.roll(WindSim.barrier, -1, axis=0)
-        # etc.
-        self.barrierE = np.roll(WindSim.barrier, 1, axis=1)
-        self.barrierW = np.roll(WindSim.barrier, -1, axis=1)
-        self.barrierNE = np.roll(self.barrierN, 1, axis=1)
-        self.barrierNW = np.roll(self.barrierN, -1, axis=1)
-        self.barrierSE = np.roll(self.barrierS, 1, axis=1)
-        self.barrierSW = np.roll(self.barrierS, -1, axis=1)
-
-        # Here comes the graphics and animation...
-        theFig = plt.figure(figsize=(20, 10))  # 8,3
-        self.fluidImage = plt.imshow(self.curl(WindSim.ux, WindSim.uy),
-                                     origin='lower',
-                                     norm=plt.Normalize(-.1, .1),
-                                     cmap=plt.get_cmap('jet'),
-                                     interpolation='none')
-        # an RGBA image
-        bImageArray = np.zeros((WindSim.height, WindSim.width, 4), np.uint8)
-        # set alpha=255 only at WindSim.barrier sites
-        bImageArray[WindSim.barrier, 3] = 255
-        self.barrierImage = plt.imshow(bImageArray, origin='lower',
-                                       interpolation='none')
-
-        # Function called for each successive animation frame:
-        self.startTime = clock()
-        if (WindSim.save):
-            self.frameList = open('output/frameList.txt', 'w')
-            # file containing list of images (to make movie)
-            self.frame_c = 0
-
-        animation = anim.FuncAnimation(theFig, self.nextFrame,
-                                       interval=0.1, frames=self.step_range, blit=False)
-        animation.new_saved_frame_seq()
-        if self.SAVE_MOVIE:
-            Writer = anim.writers['ffmpeg']
-            writer = Writer(fps=15, metadata=dict(artist='muscle-plotter'), bitrate=1800)
-            animation.save('output/realtime_simulation.mp4', writer=writer)
-
-        if WindSim.plot_active:
-            pass
-
-        plt.figure()
+            print("col_l:" + str(len(self.barrier) / WindSim.height))
+            print(self.barrier)
+
+        self.convergence = Convergence(self.lattice, WindSim.tolerance,
+                                       WindSim.max_steps)
+
+    @staticmethod
+    def cache_key(barrier):
+        """Identifies the flow around a barrier in a cache.FlowCache, by
+        every setting a cold simulation of it depends on
+        """
+        return flow_key(barrier, viscosity=WindSim.viscosity, u0=WindSim.u0,
+                        height=WindSim.height, width=WindSim.width,
+                        max_steps=WindSim.max_steps,
+                        tolerance=WindSim.tolerance,
+                        check_every=WindSim.step_range,
+                        coarse_levels=WindSim.coarse_levels,
+                        quiescent_tolerance=WindSim.quiescent_tolerance,
+                        quiescent_every=WindSim.quiescent_every,
+                        precision=WindSim.dtype.name)
+
+    def step(self, steps=None):
+        """Advances the flow and checks whether it settled
+
+        Attributes:
+          steps (int): steps to run, step_range by default. Never runs
+                       past the step budget.
+
+        Returns:
+          (str): the convergence status
+        """
+        if self.levels:
+            self.coarse_to_fine()
+        if steps is None:
+            steps = WindSim.step_range
+        steps = min(steps, self.convergence.max_steps - self.convergence.steps)
+        self.lattice.step(steps)
+        return self.convergence.checkpoint(steps)
+
+    def coarse_barrier(self, shape):
+        if self.rasterize is not None:
+            return self.rasterize(shape)
+        return resample(self.barrier.astype(float), shape) >= 0.5
+
+    @staticmethod
+    def level_shape(level):
+        """(height, width) of the lattice that is halved level times
+        """
+        return (max(WindSim.height >> level, 1),
+                max(WindSim.width >> level, 1))
+
+    @staticmethod
+    def coarse_lattice(barrier):
+        """In-process lattice around a barrier of any size. The viscosity
+        scales with the size, so that the flow has the Reynolds number of
+        the full-size lattice.
+        """
+        viscosity = (WindSim.viscosity * barrier.shape[1] /
+                     float(WindSim.width))
+        lattice = Lattice(barrier.shape[0], barrier.shape[1],
+                          viscosity, WindSim.u0,
+                          get_backend(WindSim.backend), WindSim.dtype)
+        WindSim.use_tiles(lattice)
+        lattice.set_barrier(barrier)
+        return lattice
+
+    @staticmethod
+    def use_tiles(lattice):
+        """Lets the backend skip solid (and quiescent) tiles of a lattice,
+        if it walks the lattice in tiles
+        """
+        if (WindSim.tile_size and lattice.backend is not None and
+                lattice.backend.tiled):
+            lattice.use_tiles(Tiles(lattice.height, lattice.width,
+                                    WindSim.tile_size,
+                                    WindSim.quiescent_tolerance,
+                                    WindSim.quiescent_every))
+
+    def coarse_to_fine(self, cancelled=None, progress=None):
+        """Relaxes the flow on coarser lattices first, every level starts
+        from the interpolated flow of the one before. Runs once, before
+        the first step.
+
+        Attributes:
+          cancelled (function): checked between levels (and checkpoints
+                                when progress is passed)
+          progress (function): called with a Snapshot of the coarse flow
+                               at every checkpoint, optional
+        """
+        coarse = None
+        levels, self.levels = self.levels, 0
+        relaxed, self.relaxed = self.relaxed, None
+        for level in range(levels, 0, -1):
+            if cancelled is not None and cancelled():
+                return
+            shape = WindSim.level_shape(level)
+            barrier = self.coarse_barrier(shape)
+            interpolated = False
+            if relaxed is not None and relaxed.barrier.shape == shape:
+                # the sketch may have changed since
+                lattice = relaxed
+                lattice.update_barrier(barrier)
+            else:
+                lattice = WindSim.coarse_lattice(barrier)
+                if coarse is not None:
+                    lattice.refine_from(coarse)
+                    interpolated = True
+            if progress is None:
+                convergence = lattice.run_until_converged(
+                    WindSim.tolerance, WindSim.max_steps, WindSim.step_range,
+                    interpolated)
+            else:
+                convergence = Convergence(lattice, WindSim.tolerance,
+                                          WindSim.max_steps, interpolated)
+                while convergence.status == 'running':
+                    steps = min(WindSim.step_range,
+                                convergence.max_steps - convergence.steps)
+                    lattice.step(steps)
+                    convergence.checkpoint(steps)
+                    progress(Snapshot(lattice, convergence))
+                    if cancelled is not None and cancelled():
+                        return
+            print("{0}x{1} lattice {2}".format(shape[0], shape[1],
+                                               convergence))
+            coarse = lattice
+            if convergence.status == 'diverged':
+                coarse = None
+                break
+        if coarse is not None:
+            self.lattice.refine_from(coarse)
+            self.convergence = Convergence(self.lattice, WindSim.tolerance,
+                                           WindSim.max_steps,
+                                           interpolated=True)
+
+    def snapshot(self):
+        return Snapshot(self.lattice, self.convergence)
+
+    def snapshots(self, steps=None):
+        """Steps until the flow settled, diverged or ran out of steps
+
+        Yields:
+          (Snapshot): the flow after every step(steps)
+        """
+        while self.convergence.status == 'running':
+            self.step(steps)
+            yield self.snapshot()
+
+    def run(self, renderer=None, progress=None, cancelled=None):
+        """Runs the simulation to the end without drawing anything
+
+        Attributes:
+          renderer (Renderer): gets every snapshot, optional
+          progress (function): called with every snapshot, optional
+          cancelled (function): checked between steps, the simulation
+                                stops early once it returns True
+
+        Returns:
+          (Convergence): how the simulation ended
+        """
+        startTime = time.time()
+        if self.levels:
+            self.coarse_to_fine(cancelled, progress)
+        if renderer is None and progress is None:
+            while self.convergence.status == 'running':
+                if cancelled is not None and cancelled():
+                    self.convergence.cancel()
+                    break
+                self.step()
+        else:
+            for snapshot in self.snapshots():
+                if renderer is not None:
+                    renderer.add(snapshot)
+                if progress is not None:
+                    progress(snapshot)
+                if cancelled is not None and cancelled():
+                    self.convergence.cancel()
+        if WindSim.performanceData:
+            print("Took {0} seconds".format(time.time() - startTime))
+            if self.lattice.tiles is not None:
+                print("Skipped {0:.1%} of the lattice updates".format(
+                    self.lattice.tiles.skipped_fraction))
+        print("Simulation " + str(self.convergence))
+        return self.convergence
+
+    def render(self, progress=None, cancelled=None, finished=None):
+        """Runs the simulation while saving a movie of it, then the plots
+
+        Takes the same callbacks as run()
+
+        Attributes:
+          finished (function): called once the flow is there, before the
+                               movie is encoded and the plots are saved,
+                               optional
+        """
+        renderer = Renderer('output/realtime_simulation.mp4',
+                            WindSim.height, WindSim.width)
+        try:
+            self.run(renderer, progress, cancelled)
+            if finished is not None:
+                finished()
+        finally:
+            renderer.close()
+        if self.convergence.status != 'cancelled':
+            self.plot_streamlines()
+        return self.convergence
+
+    def plot_streamlines(self):
+        if plt is None:
+            print("matplotlib is not installed, not plotting streamlines")
+            return
+        figure = plt.figure()
 
         # plot the streamlines
         if self.PLOT_STREAMLINES:
-            x_1 = np.linspace(-1, 1, len(WindSim.ux))
-            y_1 = np.linspace(-1, 1, len(WindSim.uy))
-            plt.streamplot(x_1, y_1, WindSim.ux, WindSim.uy, density=1, color='b')
+            x_1 = np.linspace(-1, 1, len(self.ux))
+            y_1 = np.linspace(-1, 1, len(self.uy))
+            plt.streamplot(x_1, y_1, self.ux, self.uy, density=1, color='b')
             plt.savefig('output/streamplot.png')
 
         # plot the streamline follower at regular intervals
         if self.PLOT_CUSTOM_STREAMLINES:
-            xRange = range(0, 200)
-            yRange = range(0, 200)
+            xRange = range(0, WindSim.width)
+            yRange = range(0, WindSim.height)
             plt.clf()
-            for y_start_value in range(5, 196, 5):
-                x, y = self.follow_through(WindSim.ux, WindSim.uy, y_start_value)
+            xs, ys, _ = self.streamlines(range(5, WindSim.height - 4, 5))
+            # NaN padding past the end of a line is not drawn
+            for x, y in zip(xs, ys):
                 plt.plot(x, y)
             plt.plot(xRange, yRange)
             plt.savefig('output/custom_streamlines.png')
+        plt.close(figure)
 
     def rgb2gray(self, rgb):
         r, g, b = rgb[:, :, 0], rgb[:, :, 1], rgb[:, :, 2]
         gray = 0.2989 * r + 0.5870 * g + 0.1140 * b
         return gray
 
-    # Move all particles by one step along their directions of motion (pbc):
+    @property
+    def ux(self):
+        return self.lattice.ux
+
+    @property
+    def uy(self):
+        return self.lattice.uy
+
+    @property
+    def rho(self):
+        return self.lattice.rho
+
+    @property
+    def barrier(self):
+        return self.lattice.barrier
+
+    def close(self):
+        self.lattice.close()
+
     def stream(self):
-        # pedro: this basically shifts the array by one step at a time,
-        # we could parametrize "1" as step to go "faster"
-        # axis 0 is north-south; + direction is north
-        WindSim.nN = np.roll(WindSim.nN, 1, axis=0)
-        WindSim.nNE = np.roll(WindSim.nNE, 1, axis=0)
-        WindSim.nNW = np.roll(WindSim.nNW, 1, axis=0)
-        WindSim.nS = np.roll(WindSim.nS, -1, axis=0)
-        WindSim.nSE = np.roll(WindSim.nSE, -1, axis=0)
-        WindSim.nSW = np.roll(WindSim.nSW, -1, axis=0)
-        # axis 1 is east-west; + direction is east
-        WindSim.nE = np.roll(WindSim.nE, 1, axis=1)
-        WindSim.nNE = np.roll(WindSim.nNE, 1, axis=1)
-        WindSim.nSE = np.roll(WindSim.nSE, 1, axis=1)
-        WindSim.nW = np.roll(WindSim.nW, -1, axis=1)
-        WindSim.nNW = np.roll(WindSim.nNW, -1, axis=1)
-        WindSim.nSW = np.roll(WindSim.nSW, -1, axis=1)
-        # Use tricky boolean arrays to handle
-        # WindSim.barrier collisions (bounce-back):
-        WindSim.nN[self.barrierN] = WindSim.nS[WindSim.barrier]
-        WindSim.nS[self.barrierS] = WindSim.nN[WindSim.barrier]
-        WindSim.nE[self.barrierE] = WindSim.nW[WindSim.barrier]
-        WindSim.nW[self.barrierW] = WindSim.nE[WindSim.barrier]
-        WindSim.nNE[self.barrierNE] = WindSim.nSW[WindSim.barrier]
-        WindSim.nNW[self.barrierNW] = WindSim.nSE[WindSim.barrier]
-        WindSim.nSE[self.barrierSE] = WindSim.nNW[WindSim.barrier]
-        WindSim.nSW[self.barrierSW] = WindSim.nNE[WindSim.barrier]
-
-    # Collide particles within each cell to redistribute velocities
-    # (could be optimized a little more):
+        self.lattice.stream()
+
     def collide(self):
-        WindSim.rho = (WindSim.n0 + WindSim.nN + WindSim.nS +
-                       WindSim.nE + WindSim.nW + WindSim.nNE +
-                       WindSim.nSE + WindSim.nNW + WindSim.nSW)
-        WindSim.ux = (WindSim.nE + WindSim.nNE + WindSim.nSE -
-                      WindSim.nW - WindSim.nNW - WindSim.nSW) / WindSim.rho
-        WindSim.uy = (WindSim.nN + WindSim.nNE + WindSim.nNW -
-                      WindSim.nS - WindSim.nSE - WindSim.nSW) / WindSim.rho
-        ux2 = WindSim.ux * WindSim.ux  # pre-compute terms used repeatedly...
-        uy2 = WindSim.uy * WindSim.uy
-        u2 = ux2 + uy2
-        omu215 = 1 - 1.5 * u2  # "one minus u2 times 1.5"
-        uxuy = WindSim.ux * WindSim.uy
-        WindSim.n0 = ((1 - WindSim.omega) * WindSim.n0 +
-                      WindSim.omega * WindSim.four9ths * WindSim.rho * omu215)
-        WindSim.nN = ((1 - WindSim.omega) * WindSim.nN +
-                      WindSim.omega * WindSim.one9th * WindSim.rho *
-                      (omu215 + 3 * WindSim.uy + 4.5 * uy2))
-        WindSim.nS = ((1 - WindSim.omega) * WindSim.nS +
-                      WindSim.omega * WindSim.one9th * WindSim.rho *
-                      (omu215 - 3 * WindSim.uy + 4.5 * uy2))
-        WindSim.nE = ((1 - WindSim.omega) * WindSim.nE +
-                      WindSim.omega * WindSim.one9th * WindSim.rho *
-                      (omu215 + 3 * WindSim.ux + 4.5 * ux2))
-        WindSim.nW = ((1 - WindSim.omega) * WindSim.nW +
-                      WindSim.omega * WindSim.one9th * WindSim.rho *
-                      (omu215 - 3 * WindSim.ux + 4.5 * ux2))
-        WindSim.nNE = ((1 - WindSim.omega) * WindSim.nNE +
-                       WindSim.omega * WindSim.one36th * WindSim.rho *
-                       (omu215 + 3 * (WindSim.ux + WindSim.uy) +
-                        4.5 * (u2 + 2 * uxuy)))
-        WindSim.nNW = ((1 - WindSim.omega) * WindSim.nNW +
-                       WindSim.omega * WindSim.one36th * WindSim.rho *
-                       (omu215 + 3 * (-WindSim.ux + WindSim.uy) +
-                        4.5 * (u2 - 2 * uxuy)))
-        WindSim.nSE = ((1 - WindSim.omega) * WindSim.nSE +
-                       WindSim.omega * WindSim.one36th * WindSim.rho *
-                       (omu215 + 3 * (WindSim.ux - WindSim.uy) +
-                        4.5 * (u2 - 2 * uxuy)))
-        WindSim.nSW = ((1 - WindSim.omega) * WindSim.nSW +
-                       WindSim.omega * WindSim.one36th * WindSim.rho *
-                       (omu215 + 3 * (-WindSim.ux - WindSim.uy) +
-                        4.5 * (u2 + 2 * uxuy)))
-        # Force steady rightward flow at ends
-        # (no need to set 0, N, and S components):
-        WindSim.nE[:, 0] = (WindSim.one9th *
-                            (1 + 3 * WindSim.u0 +
-                             4.5 * WindSim.u0**2 -
-                             1.5 * WindSim.u0**2))
-        WindSim.nW[:, 0] = (WindSim.one9th *
-                            (1 - 3 * WindSim.u0 +
-                             4.5 * WindSim.u0**2 -
-                             1.5 * WindSim.u0**2))
-        WindSim.nNE[:, 0] = (WindSim.one36th *
-                             (1 + 3 * WindSim.u0 +
-                              4.5 * WindSim.u0**2 -
-                              1.5 * WindSim.u0**2))
-        WindSim.nSE[:, 0] = (WindSim.one36th *
-                             (1 + 3 * WindSim.u0 +
-                              4.5 * WindSim.u0**2 -
-                              1.5 * WindSim.u0**2))
-        WindSim.nNW[:, 0] = (WindSim.one36th *
-                             (1 - 3 * WindSim.u0 +
-                              4.5 * WindSim.u0**2 -
-                              1.5 * WindSim.u0**2))
-        WindSim.nSW[:, 0] = (WindSim.one36th *
-                             (1 - 3 * WindSim.u0 +
-                              4.5 * WindSim.u0**2 -
-                              1.5 * WindSim.u0**2))
+        self.lattice.collide()
+
+    def streamlines(self, start_y):
+        """Traces streamlines from the tunnel entry at all start_y rows
+        """
+        return trace_streamlines(self.ux, self.uy, start_y,
+                                 barrier=self.barrier)
 
     def get_streamline(self, _y):
-        x, y = self.follow_through(WindSim.ux, WindSim.uy, _y)
-        if self.PLOT_INDIVIDUAL_STREAMLINES:
+        xs, ys, lengths = self.streamlines([_y])
+        x = xs[0, :lengths[0]]
+        y = ys[0, :lengths[0]]
+        if self.PLOT_INDIVIDUAL_STREAMLINES and plt is not None:
             plt.clf()
             plt.plot(x, y)
-            xRange = range(0, 200)
-            yRange = range(0, 200)
+            xRange = range(0, WindSim.width)
+            yRange = range(0, WindSim.height)
             plt.plot(xRange, yRange)
             plt.savefig("output/streamline_at_" + str(_y) + ".png")
         return (x, y)
 
-    def follow_through(self, ux, uy, start_y=0):
-        x0 = 0
-        y0 = start_y
-        x = [x0]
-        y = [y0]
-
-        try:
-            counter = 10000
-            while counter > 1:
-                xRun = ux[round(y[-1]), round(x[-1])]  # + 0.0045
-                if xRun < 0:
-                    counter = 0
-                    print("cancelled line: line ends early")
-                yRun = uy[round(y[-1]), round(x[-1])]
-
-                travel_distance = (xRun ** 2 + yRun ** 2) ** 0.5
-                x.append((x[-1] + xRun / travel_distance / 2))
-                y.append((y[-1] + yRun / travel_distance / 2))
-
-                counter -= 1
-        except Exception as e:
-            print e
-        print ("Counter: {0}".format(counter))
-        return (x, y)
-
     # Compute curl of the macroscopic velocity field:
     def curl(self, ux, uy):
-        return (np.roll(uy, -1, axis=1) -
-                np.roll(uy, 1, axis=1) -
-                np.roll(ux, -1, axis=0) +
-                np.roll(ux, 1, axis=0))
-
-    def nextFrame(self, arg):
-        # (arg is the frame number, which we don't need)
-        self.frame_c += 1
-        print("computed frame:" + str(self.frame_c))
-        if WindSim.performanceData and (arg % 30 == 0) and (arg > 0):
-            endTime = clock()
-            print ("Took {0} seconds".format(endTime - self.startTime))
-            print ("%1.1f" % (30 / (endTime - self.startTime)),
-                   'frames per second')
-            self.startTime = endTime
-            if (WindSim.save):
-                frameName = 'output/frame%04d.png' % arg
-                plt.savefig(frameName)
-                self.frameList.write(frameName + '\n')
-        for step in range(WindSim.step_range):
-            self.stream()
-            self.collide()
-        self.fluidImage.set_array(self.curl(WindSim.ux, WindSim.uy))
-        return (self.fluidImage, self.barrierImage)
+        return curl(ux, uy)
@@ -0,0 +1,135 @@
+"""Runs wind tunnel simulations in the background.
+
+Pen input arrives on the OSC thread and must never wait for the fluid
+dynamics. A Job runs one piece of work on its own thread and is the handle
+to it: it passes on progress, can be cancelled and its result can be
+waited for up to a timeout. Jobs submitted to the same Worker run one
+after the other and a new job cancels the one still in flight.
+"""
+from __future__ import print_function
+
+import threading
+import traceback
+
+
+class Job(object):
+    """Future-style handle of work running in a background thread
+
+    Attributes:
+      progress (object): the latest value passed to report()
+      error (Exception): what the work raised, if it failed
+    """
+    def __init__(self, work, progress=None):
+        """
+        Attributes:
+          work (function): called with the job on the worker thread,
+                           its return value is the result
+          progress (function): called with every reported progress value
+        """
+        super(Job, self).__init__()
+        self._work = work
+        self._callbacks = [] if progress is None else [progress]
+        self._cancelled = threading.Event()
+        self._finished = threading.Event()
+        self._result = None
+        self.progress = None
+        self.error = None
+
+    def cancel(self):
+        """Asks the work to stop, it checks cancelled() between steps
+        """
+        self._cancelled.set()
+
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def pause(self, seconds):
+        """Sleeps, but wakes up as soon as the job is cancelled
+
+        Returns:
+          (bool): whether the job was cancelled
+        """
+        return self._cancelled.wait(seconds)
+
+    def done(self):
+        return self._finished.is_set()
+
+    def add_progress_callback(self, callback):
+        self._callbacks.append(callback)
+
+    def report(self, progress):
+        """Called by the work to pass on how far it got
+        """
+        self.progress = progress
+        for callback in list(self._callbacks):
+            callback(progress)
+
+    def result(self, timeout=None):
+        """Waits for the work to finish
+
+        Attributes:
+          timeout (float): seconds to wait at most, None waits for good
+
+        Returns:
+          the result of the work, None if it did not finish in time,
+          was cancelled or failed
+        """
+        self._finished.wait(timeout)
+        if self.done() and self.error is None:
+            return self._result
+        return None
+
+    def run(self, after=None):
+        """Does the work on the calling thread once the job after finished
+        """
+        if after is not None:
+            after._finished.wait()
+        try:
+            if not self.cancelled():
+                self._result = self._work(self)
+        except Exception as e:
+            self.error = e
+            traceback.print_exc()
+        finally:
+            self._finished.set()
+
+
+class Worker(object):
+    """Runs submitted jobs one at a time, the latest one supersedes the rest
+    """
+    def __init__(self):
+        super(Worker, self).__init__()
+        self._lock = threading.Lock()
+        self._job = None
+
+    @property
+    def job(self):
+        """The most recently submitted job (or None)
+        """
+        return self._job
+
+    def submit(self, work, progress=None, supersede=True):
+        """Cancels the job in flight and starts work after it stopped
+
+        Attributes:
+          supersede (bool): False lets the job in flight finish first
+
+        Returns:
+          (Job): handle of the new job
+        """
+        job = Job(work, progress)
+        with self._lock:
+            previous = self._job
+            if previous is not None and supersede:
+                previous.cancel()
+            thread = threading.Thread(target=job.run, args=(previous,))
+            thread.daemon = True
+            thread.setName('Wind tunnel')
+            thread.start()
+            self._job = job
+        return job
+
+    def cancel(self):
+        with self._lock:
+            if self._job is not None:
+                self._job.cancel()
@@ -1,6 +1,30 @@
 import os
 import sys
+import types
 sys.path.insert(0, os.path.abspath('..'))
 
 import muscleplotter
 from muscleplotter.utils.utils import remap
+
+
+def wind_tunnel_settings(test, **settings):
+    """Overrides WindSim settings for one test. Every setting is restored
+    after it, also those the test changes on its own.
+
+    Attributes:
+      test (unittest.TestCase): restores the settings in its cleanup
+      settings: WindSim class attributes and their values for the test
+    """
+    # reads the configuration, only tests of the wind tunnel need it
+    from muscleplotter.modules.windtunnel.windtunnelsimulator import WindSim
+    saved = dict((name, value) for name, value in vars(WindSim).items()
+                 if not name.startswith('_') and
+                 not isinstance(value, (types.FunctionType, staticmethod,
+                                        property)))
+
+    def restore():
+        for name, value in saved.items():
+            setattr(WindSim, name, value)
+    test.addCleanup(restore)
+    for name, value in settings.items():
+        setattr(WindSim, name, value)
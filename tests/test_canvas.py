@@ -0,0 +1,213 @@
+'''Checks that targets are placed on the paper like point by point.
+
+Example (from the repository root, which has the configuration):
+    $ python -m pytest tests/test_canvas.py
+'''
+from math import cos, sin, radians
+import time
+import unittest
+
+import numpy as np
+
+import context
+from muscleplotter.modules.model import canvas
+from muscleplotter.modules.model.canvas import (SimpleSine, SimpleFunction,
+                                                ConnectPoints,
+                                                ConnectAsSegments,
+                                                TargetCache)
+from muscleplotter.modules.ems.control.target import Target
+
+ORIGIN = (1700, 3000)
+TILT = 12
+SPAN = 4300
+
+
+def place_point(point, tilt, origin):
+    """One point reverted, tilted and shifted like the canvas used to
+    """
+    theata = radians(tilt)
+    rm = np.array([[cos(theata), -sin(theata)],
+                   [sin(theata), cos(theata)]], dtype='f')
+    rotated = np.dot((point[0], -1 * point[1]), rm)
+    return (origin[0] + rotated[0], origin[1] + rotated[1])
+
+
+class Placement(unittest.TestCase):
+
+    def check_canvas(self, canvas, x, y):
+        canvas.set_region(ORIGIN, TILT, SPAN, 600)
+        xs, ys = canvas.calculate_target_coordinates()
+        expected = np.array([place_point(point, TILT, ORIGIN)
+                             for point in zip(x, y)])
+        self.assertTrue(np.allclose(xs, expected[:, 0], rtol=0, atol=1e-9))
+        self.assertTrue(np.allclose(ys, expected[:, 1], rtol=0, atol=1e-9))
+        self.assertTrue(np.allclose(canvas.raw_coordinates[:, 1], -y))
+        self.assertEqual(len(canvas.target_points), -(-SPAN // 5))
+
+    def test_sine(self):
+        x = np.arange(SPAN, dtype=float)
+        y = 300 * np.sin(x * 2 * np.pi / 1200 - radians(30))
+        self.check_canvas(SimpleSine(1200, 300, 30), x, y - y[0])
+
+    def test_function(self):
+        x = np.arange(SPAN, dtype=float)
+        y = 100 * (1.5 * (x / 2000) ** 2 - 2 * (x / 2000) + 0.3)
+        self.check_canvas(SimpleFunction(100, 1.5, -2, 0.3), x, y)
+
+    def test_segments(self):
+        points = [(0, 0), (2000, 300), (SPAN, -100)]
+        x = np.arange(SPAN)
+        y = np.interp(x, *zip(*points))
+        self.check_canvas(ConnectAsSegments(points), x, y)
+
+
+class Region(unittest.TestCase):
+
+    def setUp(self):
+        self.canvas = SimpleSine(1200, 300)
+        self.canvas.set_region(ORIGIN, TILT, SPAN, 800)
+
+    def test_target_inside(self):
+        # the placed target runs along the tilted major axis
+        xs, ys = self.canvas.calculate_target_coordinates()
+        for x, y in zip(xs[1:-1:50], ys[1:-1:50]):
+            self.assertIs(self.canvas.check_if_inside((x, y)), True)
+
+    def test_done(self):
+        end = self.canvas.placement_matrix()
+        beyond = np.dot((SPAN * 1.5, 100, 1), end)[:2]
+        before = np.dot((-100, 0, 1), end)[:2]
+        self.assertEqual(self.canvas.check_if_inside(beyond), 'done')
+        self.assertIsNone(self.canvas.check_if_inside(before))
+
+    def test_classify_locations(self):
+        random = np.random.RandomState(0)
+        locations = np.column_stack([random.uniform(0, 12000, 2000),
+                                     random.uniform(1000, 5000, 2000)])
+        inside, done = self.canvas.classify_locations(locations)
+        expected = [self.canvas.check_if_inside(location)
+                    for location in locations]
+        self.assertEqual(list(inside), [state is True for state in expected])
+        self.assertEqual(list(done), [state == 'done' for state in expected])
+        self.assertTrue(inside.any() and done.any())
+
+
+class Cache(unittest.TestCase):
+
+    def setUp(self):
+        self.shared = canvas.target_cache
+        canvas.target_cache = TargetCache(2)
+
+    def tearDown(self):
+        canvas.target_cache = self.shared
+
+    def place(self, plot, origin=ORIGIN):
+        plot.set_region(origin, TILT, SPAN, 600)
+        return plot.calculate_target_coordinates()
+
+    def test_hit(self):
+        points = [(0, 0), (2000, 300), (SPAN, -100)]
+        first = self.place(ConnectAsSegments(points))
+        # placed elsewhere, the shape is looked up
+        moved = self.place(ConnectAsSegments(list(points)), (1800, 2900))
+        self.assertEqual((canvas.target_cache.hits,
+                          canvas.target_cache.misses), (1, 1))
+        self.assertTrue(np.allclose(moved - first, [[100], [-100]]))
+        self.place(ConnectAsSegments([(0, 0), (SPAN, 10)]))
+        self.assertEqual(canvas.target_cache.misses, 2)
+
+    def test_least_recently_used(self):
+        for period in (1000, 1200, 1000, 1400, 1200):
+            self.place(SimpleSine(period, 300))
+        # 1200 was evicted by 1400, 1000 was used more recently
+        self.assertEqual((canvas.target_cache.hits,
+                          canvas.target_cache.misses), (1, 4))
+
+    def test_read_only(self):
+        plot = SimpleFunction(100, 1, 0)
+        self.place(plot)
+        x, y = canvas.target_cache.get(plot.target_key(), None)
+        self.assertRaises(ValueError, y.fill, 0)
+
+
+class Lazy(unittest.TestCase):
+
+    def place(self, plot, lazy, prefetch=False):
+        if lazy:
+            plot.enable_lazy_target(500, prefetch)
+        plot.set_region(ORIGIN, TILT, SPAN, 600)
+        coordinates = plot.calculate_target_coordinates()
+        return coordinates, plot.raw_coordinates
+
+    def test_same_points(self):
+        points = [(0, 0), (1000, 300), (2500, -100), (SPAN, 50)]
+        for make in (lambda: SimpleSine(1200, 300, 30),
+                     lambda: SimpleFunction(100, 1.5, -2, 0.3),
+                     lambda: ConnectPoints(points)):
+            coordinates, raw = self.place(make(), False)
+            first, lazy = self.place(make(), True)
+            self.assertEqual(first.shape, (2, 500))
+            self.assertTrue(np.allclose(first, coordinates[:, :500]))
+            self.assertEqual(len(lazy), len(raw))
+            for index in (0, 499, 500, 2222, SPAN - 1, -1):
+                self.assertTrue(np.allclose(lazy[index], raw[index]))
+            self.assertRaises(IndexError, lazy.__getitem__, SPAN)
+
+    def test_chunks_on_demand(self):
+        _, lazy = self.place(SimpleSine(1200, 300), True)
+        self.assertEqual(sorted(lazy.chunks), [0])
+        lazy[1700]
+        self.assertEqual(sorted(lazy.chunks), [0, 3])
+
+    def test_prefetch(self):
+        _, lazy = self.place(SimpleSine(1200, 300), True, prefetch=True)
+        lazy[600]
+        deadline = time.time() + 5
+        while 2 not in lazy.chunks and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(sorted(lazy.chunks), [0, 1, 2])
+
+    def test_whole_target(self):
+        eager = SimpleSine(1200, 300, 30)
+        coordinates, raw = self.place(eager, False)
+        plot = SimpleSine(1200, 300, 30)
+        _, lazy = self.place(plot, True)
+        # drawing the target does not evaluate the chunks
+        self.assertTrue(np.allclose(plot.target_points, eager.target_points))
+        self.assertEqual(sorted(lazy.chunks), [0])
+        self.assertTrue(np.allclose(plot.target_coordinates(), coordinates))
+        self.assertTrue(np.allclose(lazy.materialize(), raw))
+        self.assertEqual(len(lazy.chunks), -(-SPAN // 500))
+        self.assertIs(eager.target_coordinates(), coordinates)
+
+    def test_float_span(self):
+        # streamlines span to their last point, which is a float
+        points = [(0, 0), (1000, 300), (2500, -100), (SPAN - 0.5, 50)]
+        eager = ConnectAsSegments(points)
+        eager.set_region(ORIGIN, TILT, SPAN - 0.5, 600)
+        coordinates = eager.calculate_target_coordinates()
+        plot = ConnectAsSegments(points)
+        plot.enable_lazy_target(500)
+        plot.set_region(ORIGIN, TILT, SPAN - 0.5, 600)
+        plot.calculate_target_coordinates()
+        self.assertEqual(len(plot.raw_coordinates), SPAN)
+        self.assertTrue(np.allclose(plot.target_coordinates(), coordinates))
+        self.assertTrue(np.allclose(plot.target_points, eager.target_points))
+        self.assertEqual(len(Target(plot).x_variables), SPAN)
+
+    def test_target(self):
+        plot = SimpleSine(1200, 300, 30)
+        plot.enable_lazy_target(500)
+        plot.set_region(ORIGIN, TILT, SPAN, 600)
+        target = Target(plot)
+        self.assertEqual(len(target.x_variables), SPAN)
+        self.assertEqual(len(target.y_variables), SPAN)
+        eager = SimpleSine(1200, 300, 30)
+        eager.set_region(ORIGIN, TILT, SPAN, 600)
+        x, y = eager.calculate_target_coordinates()
+        self.assertTrue(np.allclose(target.x_variables, x))
+        self.assertTrue(np.allclose(target.y_variables, y))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+'''Checks that streamlines follow the newest checkpoint within the budget.
+
+Example (from the repository root, which has the configuration):
+    $ python -m pytest tests/test_windtunnel_anytime.py
+'''
+import time
+import unittest
+
+import context
+from muscleplotter.dispatchers.winddispatcher import WindDispatcher
+from muscleplotter.modules.windtunnel.windtunnelsimulator import WindSim
+from muscleplotter.modules.windtunnel.references import (SKETCH_AREA,
+                                                         SKETCHES,
+                                                         reference_barrier)
+
+SHAPE = (40, 40)
+BUDGET = 0.05
+TIMEOUT = 30
+
+
+class Anytime(unittest.TestCase):
+
+    def setUp(self):
+        context.wind_tunnel_settings(self, height=SHAPE[0], width=SHAPE[1],
+                                     coarse_levels=1, max_steps=60,
+                                     DEBUG=False)
+
+    def test_coarse_checkpoints(self):
+        snapshots = []
+        WindSim(reference_barrier('cylinder', SHAPE)).run(
+            progress=snapshots.append)
+        shapes = [snapshot.ux.shape for snapshot in snapshots]
+        self.assertEqual(shapes[0], (20, 20))
+        self.assertEqual(shapes[-1], SHAPE)
+
+    def check_streamline(self, anytime):
+        dispatcher = WindDispatcher(*SKETCH_AREA)
+        dispatcher.cache = None
+        dispatcher.anytime = anytime
+        dispatcher.streamline_wait = BUDGET
+        coarse = []
+        simulation = WindSim(reference_barrier('cylinder', SHAPE))
+        simulation.coarse_to_fine(progress=coarse.append)
+        dispatcher.report_progress(coarse[-1])
+        # a simulation that is still running when the streamline is needed
+        job = dispatcher.simulation_job = dispatcher.worker.submit(
+            lambda job: job.pause(10))
+        try:
+            start = time.time()
+            # a row below the cylinder
+            line = dispatcher.plot_streamline(SHAPE[0] / 8)
+            self.assertLess(time.time() - start, 1)
+        finally:
+            job.cancel()
+        return line
+
+    def test_newest_checkpoint(self):
+        x, y = self.check_streamline(True)
+        self.assertGreater(len(x), SHAPE[1] / 2)
+
+    def test_previous_flow(self):
+        self.assertIsNone(self.check_streamline(False))
+
+
+class FinishedFlow(unittest.TestCase):
+
+    def setUp(self):
+        context.wind_tunnel_settings(self, height=SHAPE[0], width=SHAPE[1],
+                                     coarse_levels=0, max_steps=60,
+                                     DEBUG=False, RENDER=False)
+        self.dispatcher = WindDispatcher(*SKETCH_AREA)
+        self.dispatcher.cache = None
+        self.dispatcher.live = False
+
+    def tearDown(self):
+        self.dispatcher.cancel()
+
+    def simulate(self, sketch):
+        self.dispatcher.sketches = [list(stroke)
+                                    for stroke in SKETCHES[sketch]]
+        return self.dispatcher.runSimulation().result(TIMEOUT)
+
+    def test_diverged(self):
+        simulation = self.simulate('plate')
+        stream_function = self.dispatcher.stream_function
+        self.assertIs(self.dispatcher.simulation, simulation)
+        # far too fast for so little viscosity
+        WindSim.viscosity, WindSim.u0 = 0.005, 0.4
+        self.assertIsNone(self.simulate('cylinder'))
+        # streamlines still follow the flow around the plate
+        self.assertIs(self.dispatcher.stream_function, stream_function)
+        self.assertIs(self.dispatcher.simulation, simulation)
+        self.assertIsNotNone(self.dispatcher.plot_streamline(5))
+
+    def test_published_before_plots(self):
+        published = []
+        plot_streamlines = WindSim.plot_streamlines
+
+        def plot(simulation):
+            published.append(self.dispatcher.simulation is simulation)
+        WindSim.RENDER = True
+        WindSim.plot_streamlines = plot
+        try:
+            simulation = self.simulate('plate')
+        finally:
+            WindSim.plot_streamlines = plot_streamlines
+        self.assertEqual(published, [True])
+        self.assertIs(self.dispatcher.simulation, simulation)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+'''Checks that every wind tunnel backend agrees with the numpy reference.
+
+Example:
+    $ python -m unittest test_windtunnel_backends
+
+Backends whose package is not installed are skipped.
+'''
+import unittest
+
+import numpy as np
+
+import context
+from muscleplotter.modules.windtunnel.lattice import Lattice
+from muscleplotter.modules.windtunnel.backends import BACKENDS
+
+TOLERANCE = 1e-10
+STEPS = 60
+
+
+def reference_barrier(height=60, width=90):
+    barrier = np.zeros((height, width), bool)
+    y, x = np.mgrid[:height, :width]
+    barrier[(y - height / 2) ** 2 + (x - width / 4) ** 2 < 8 ** 2] = True
+    barrier[10:13, 45:70] = True
+    # bounce-back wraps around the periodic edges
+    barrier[:2, 20:30] = True
+    barrier[30:40, -2:] = True
+    return barrier
+
+
+class BackendAgreement(unittest.TestCase):
+
+    def setUp(self):
+        self.barrier = reference_barrier()
+        self.reference = Lattice(*self.barrier.shape)
+        self.reference.set_barrier(self.barrier)
+        self.reference.step(STEPS)
+
+    def check_backend(self, name):
+        backend = BACKENDS[name]
+        if not backend.available():
+            raise unittest.SkipTest(name + ' is not installed')
+        lattice = Lattice(*self.barrier.shape, backend=backend())
+        lattice.set_barrier(self.barrier)
+        lattice.step(STEPS)
+        for field in ('populations', 'rho', 'ux', 'uy'):
+            difference = np.abs(getattr(lattice, field) -
+                                getattr(self.reference, field)).max()
+            self.assertLess(difference, TOLERANCE,
+                            '{0} {1} deviates by {2}'
+                            .format(name, field, difference))
+
+    def test_numpy(self):
+        self.check_backend('numpy')
+
+    def test_numexpr(self):
+        self.check_backend('numexpr')
+
+    def test_numba(self):
+        self.check_backend('numba')
+
+
+if __name__ == '__main__':
+    unittest.main()
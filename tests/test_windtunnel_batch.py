@@ -0,0 +1,76 @@
+'''Checks that an ensemble lattice matches its members run one by one.
+
+Example:
+    $ python -m unittest test_windtunnel_batch
+'''
+import unittest
+
+import numpy as np
+
+import context
+from muscleplotter.modules.windtunnel.lattice import Lattice
+from muscleplotter.modules.windtunnel.batch import BatchLattice
+from muscleplotter.modules.windtunnel.backends import BACKENDS
+from test_windtunnel_backends import reference_barrier
+
+TOLERANCE = 1e-10
+STEPS = 40
+VISCOSITY = [0.01, 0.02, 0.04]
+U0 = [0.1, 0.08, 0.12]
+
+
+class Ensemble(unittest.TestCase):
+
+    def setUp(self):
+        barrier = reference_barrier()
+        self.barriers = [barrier, barrier[::-1], np.roll(barrier, 20, 1)]
+        self.members = []
+        for barrier, viscosity, u0 in zip(self.barriers, VISCOSITY, U0):
+            lattice = Lattice(*barrier.shape, viscosity=viscosity, u0=u0)
+            lattice.set_barrier(barrier)
+            lattice.step(STEPS)
+            self.members.append(lattice)
+
+    def check_backend(self, name):
+        backend = BACKENDS[name]
+        if not backend.available():
+            raise unittest.SkipTest(name + ' is not installed')
+        batch = BatchLattice(*self.barriers[0].shape, viscosity=VISCOSITY,
+                             u0=U0, backend=backend())
+        batch.set_barrier(self.barriers)
+        batch.step(STEPS)
+        self.assertEqual(batch.ux.shape, (3,) + self.barriers[0].shape)
+        for k, member in enumerate(self.members):
+            for field in ('rho', 'ux', 'uy'):
+                difference = np.abs(getattr(batch, field)[k] -
+                                    getattr(member, field)).max()
+                self.assertLess(difference, TOLERANCE,
+                                '{0} {1}[{2}] deviates by {3}'
+                                .format(name, field, k, difference))
+        self.assertFalse(batch.diverged().any())
+
+    def test_numpy(self):
+        self.check_backend('numpy')
+
+    def test_numexpr(self):
+        self.check_backend('numexpr')
+
+    def test_shared_barrier(self):
+        batch = BatchLattice(*self.barriers[0].shape, viscosity=0.02,
+                             size=2)
+        batch.set_barrier(self.barriers[0])
+        batch.step(STEPS)
+        self.assertTrue(np.array_equal(batch.ux[0], batch.ux[1]))
+
+    def test_diverged(self):
+        # a viscosity this low blows up within a hundred steps
+        batch = BatchLattice(*self.barriers[0].shape,
+                             viscosity=[0.02, 0.0005])
+        batch.set_barrier(self.barriers[0])
+        with np.errstate(all='ignore'):
+            batch.step(100)
+        self.assertEqual(list(batch.diverged()), [False, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+'''Checks that a benchmark case runs and reports every measurement.
+
+Example:
+    $ python -m unittest test_windtunnel_benchmark
+'''
+import unittest
+
+import context
+from muscleplotter.modules.windtunnel import benchmark
+
+PHASES = ('barrier', 'simulation', 'stream_function', 'trace', 'rendering')
+
+
+def tiny_case(**changes):
+    case = {'sketch': 'cylinder', 'size': 32, 'backend': 'numpy',
+            'precision': 'float64', 'steps': 20, 'tile_size': 0,
+            'quiescent_tolerance': 0}
+    case.update(changes)
+    return case
+
+
+class RunCase(unittest.TestCase):
+
+    def test_record(self):
+        result = benchmark.run_case(tiny_case())
+        self.assertEqual(sorted(result['phases']), sorted(PHASES))
+        for seconds in result['phases'].values():
+            self.assertGreaterEqual(seconds, 0)
+        # simulation, publishing and one lookup, not every phase
+        phases = result['phases']
+        self.assertGreaterEqual(result['latency'], phases['simulation'])
+        self.assertLessEqual(result['latency'],
+                             phases['simulation'] + phases['stream_function'])
+        self.assertGreater(result['mlups'], 0)
+        self.assertGreater(result['peak_memory_mb'], 0)
+        self.assertEqual(result['skipped'], 0)
+        # the case itself is part of the record
+        self.assertEqual(result['sketch'], 'cylinder')
+        self.assertEqual(result['size'], 32)
+
+    def test_tiles(self):
+        result = benchmark.run_case(tiny_case(tile_size=8))
+        self.assertGreaterEqual(result['skipped'], 0)
+        self.assertLess(result['skipped'], 1)
+        self.assertIn('peak_memory_mb', result)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+'''Checks that finished flows are cached by content and evicted LRU first.
+
+Example (from the repository root, which has the configuration):
+    $ python -m pytest tests/test_windtunnel_cache.py
+'''
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import context
+from muscleplotter.modules.windtunnel.cache import FlowCache, flow_key
+from muscleplotter.modules.windtunnel.windtunnelsimulator import WindSim
+from muscleplotter.modules.windtunnel.references import (SKETCH_AREA,
+                                                         SKETCHES)
+from muscleplotter.dispatchers.winddispatcher import WindDispatcher
+
+SHAPE = (40, 40)
+TIMEOUT = 30
+
+
+def fields(value, shape=(20, 30)):
+    return [np.full(shape, value + i) for i in range(3)]
+
+
+class FlowCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.barrier = np.zeros((20, 30), bool)
+        self.barrier[8:12, 5:7] = True
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_key(self):
+        key = flow_key(self.barrier, viscosity=0.02, u0=0.1)
+        self.assertEqual(key, flow_key(self.barrier.copy(), u0=0.1,
+                                       viscosity=0.02))
+        self.assertNotEqual(key, flow_key(self.barrier, viscosity=0.03,
+                                          u0=0.1))
+        moved = np.roll(self.barrier, 1, axis=1)
+        self.assertNotEqual(key, flow_key(moved, viscosity=0.02, u0=0.1))
+
+    def test_hit(self):
+        cache = FlowCache(self.directory)
+        key = flow_key(self.barrier)
+        self.assertIsNone(cache.load(key))
+        cache.store(key, *fields(1.0))
+        loaded = cache.load(key)
+        self.assertIsInstance(loaded, np.memmap)
+        self.assertEqual(loaded.shape, (3, 20, 30))
+        self.assertTrue(np.all(loaded[2] == 3.0))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_least_recently_used_evicted(self):
+        entry = np.array(fields(0.0)).nbytes
+        # room for two entries and the .npy headers
+        cache = FlowCache(self.directory, 2 * entry + 1024)
+        for i, key in enumerate(['a', 'b', 'c']):
+            if key == 'c':
+                # 'a' was used after 'b'
+                self.assertIsNotNone(cache.load('a'))
+            cache.store(key, *fields(i))
+            os.utime(cache.path(key), (i * 10, i * 10))
+        self.assertIsNotNone(cache.load('a'))
+        self.assertIsNone(cache.load('b'))
+        self.assertIsNotNone(cache.load('c'))
+
+
+class SimulationCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        context.wind_tunnel_settings(self, height=SHAPE[0], width=SHAPE[1],
+                                     coarse_levels=0, max_steps=60,
+                                     DEBUG=False, RENDER=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_key_settings(self):
+        barrier = np.zeros(SHAPE, bool)
+        key = WindSim.cache_key(barrier)
+        WindSim.coarse_levels = 1
+        self.assertNotEqual(WindSim.cache_key(barrier), key)
+        WindSim.coarse_levels = 0
+        WindSim.step_range += 10
+        self.assertNotEqual(WindSim.cache_key(barrier), key)
+
+    def test_cold_runs_only(self):
+        dispatcher = WindDispatcher(*SKETCH_AREA)
+        dispatcher.cache = FlowCache(self.directory)
+        dispatcher.live = False
+        dispatcher.warm_start = True
+        for sketch in ('plate', 'cylinder'):
+            dispatcher.sketches = [list(stroke)
+                                   for stroke in SKETCHES[sketch]]
+            simulation = dispatcher.runSimulation().result(TIMEOUT)
+        # the cylinder continued from the flow around the plate
+        self.assertFalse(simulation.cold)
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+        key = WindSim.cache_key(simulation.barrier)
+        self.assertIsNone(dispatcher.cache.load(key))
+        dispatcher.cancel()
+
+
+if __name__ == '__main__':
+    unittest.main()
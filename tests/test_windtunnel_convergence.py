@@ -0,0 +1,106 @@
+'''Checks how a simulation tells it is done.
+
+Example (from the repository root, which has the configuration):
+    $ python -m pytest tests/test_windtunnel_convergence.py
+'''
+import unittest
+
+import numpy as np
+
+import context
+from muscleplotter.modules.windtunnel.lattice import Lattice, Convergence
+from muscleplotter.modules.windtunnel.windtunnelsimulator import WindSim
+from test_windtunnel_backends import reference_barrier
+
+TOLERANCE = 0.03
+MAX_STEPS = 2000
+
+
+class RunUntilConverged(unittest.TestCase):
+
+    def setUp(self):
+        self.barrier = reference_barrier()
+
+    def lattice(self, **parameters):
+        lattice = Lattice(*self.barrier.shape, **parameters)
+        lattice.set_barrier(self.barrier)
+        return lattice
+
+    def test_converged(self):
+        convergence = self.lattice().run_until_converged(TOLERANCE,
+                                                         MAX_STEPS)
+        self.assertEqual(convergence.status, 'converged')
+        self.assertLess(convergence.residual, TOLERANCE)
+        self.assertLess(convergence.steps, MAX_STEPS)
+        self.assertEqual(convergence.steps % 20, 0)
+
+    def test_diverged(self):
+        # far too fast for so little viscosity
+        lattice = self.lattice(viscosity=0.005, u0=0.4)
+        convergence = lattice.run_until_converged(TOLERANCE, MAX_STEPS)
+        self.assertEqual(convergence.status, 'diverged')
+        self.assertLess(convergence.steps, MAX_STEPS)
+
+    def test_budget(self):
+        convergence = self.lattice().run_until_converged(TOLERANCE, 50,
+                                                         check_every=20)
+        self.assertEqual(convergence.status, 'budget')
+        # the last checkpoint only runs what is left of the budget
+        self.assertEqual(convergence.steps, 50)
+        self.assertGreaterEqual(convergence.residual, TOLERANCE)
+
+    def test_checkpoint(self):
+        lattice = self.lattice()
+        convergence = Convergence(lattice, TOLERANCE, MAX_STEPS)
+        self.assertEqual(convergence.status, 'running')
+        lattice.step(10)
+        # the flow only starts to go around the barrier
+        self.assertEqual(convergence.checkpoint(10), 'running')
+        self.assertEqual(convergence.steps, 10)
+        self.assertGreater(convergence.residual, TOLERANCE)
+
+    def test_interpolated(self):
+        convergence = Convergence(self.lattice(), TOLERANCE, MAX_STEPS,
+                                  interpolated=True)
+        # nothing changed, but the baseline was not a flow of this lattice
+        self.assertEqual(convergence.checkpoint(0), 'running')
+        self.assertEqual(convergence.residual, 0)
+        self.assertEqual(convergence.checkpoint(0), 'converged')
+
+    def test_cancelled(self):
+        convergence = Convergence(self.lattice(), TOLERANCE, MAX_STEPS)
+        convergence.cancel()
+        self.assertEqual(convergence.status, 'cancelled')
+        self.assertEqual(str(convergence),
+                         'cancelled after 0 steps (residual inf)')
+
+
+class CancelledSimulation(unittest.TestCase):
+
+    def setUp(self):
+        context.wind_tunnel_settings(self, height=40, width=40,
+                                     coarse_levels=0, max_steps=400)
+        barrier = np.zeros((40, 40), bool)
+        barrier[15:25, 10:14] = True
+        self.simulation = WindSim(barrier)
+
+    def tearDown(self):
+        self.simulation.close()
+
+    def test_cancelled(self):
+        convergence = self.simulation.run(cancelled=lambda: True)
+        self.assertEqual(convergence.status, 'cancelled')
+        self.assertEqual(convergence.steps, 0)
+
+    def test_cancelled_with_progress(self):
+        snapshots = []
+        convergence = self.simulation.run(
+            progress=snapshots.append,
+            cancelled=lambda: len(snapshots) == 2)
+        self.assertEqual(convergence.status, 'cancelled')
+        self.assertEqual(len(snapshots), 2)
+        self.assertEqual(convergence.steps, snapshots[-1].steps)
+
+
+if __name__ == '__main__':
+    unittest.main()
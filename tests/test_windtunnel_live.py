@@ -0,0 +1,89 @@
+'''Checks the live relaxation while sketching and its handoff at pen up.
+
+Example (from the repository root, which has the configuration):
+    $ python -m pytest tests/test_windtunnel_live.py
+'''
+import time
+import unittest
+
+import numpy as np
+
+import context
+from muscleplotter.dispatchers.winddispatcher import WindDispatcher
+from muscleplotter.modules.windtunnel.windtunnelsimulator import WindSim
+from muscleplotter.modules.windtunnel.references import (SKETCH_AREA,
+                                                         SKETCHES)
+
+SHAPE = (40, 40)
+TIMEOUT = 30
+
+
+class LiveSketching(unittest.TestCase):
+
+    def setUp(self):
+        context.wind_tunnel_settings(self, height=SHAPE[0], width=SHAPE[1],
+                                     coarse_levels=1, max_steps=60,
+                                     DEBUG=False, RENDER=False)
+        self.dispatcher = WindDispatcher(*SKETCH_AREA)
+        self.dispatcher.cache = None
+        self.dispatcher.live = True
+        self.dispatcher.live_pause = 0
+        self.dispatcher.streamline_wait = 0.25
+
+    def tearDown(self):
+        self.dispatcher.cancel()
+
+    def draw(self, stroke):
+        for location in stroke:
+            self.dispatcher.serve(None, tuple(location))
+
+    def wait_for_live_lattice(self):
+        deadline = time.time() + TIMEOUT
+        while (self.dispatcher.live_lattice is None and
+               time.time() < deadline):
+            time.sleep(0.01)
+        self.assertIsNotNone(self.dispatcher.live_lattice)
+
+    def test_handoff(self):
+        self.draw(SKETCHES['cylinder'][0])
+        relax = self.dispatcher.relax_job
+        self.wait_for_live_lattice()
+        live = self.dispatcher.live_lattice
+        self.assertEqual(live.barrier.shape,
+                         WindSim.level_shape(WindSim.coarse_levels))
+        job = self.dispatcher.runSimulation()
+        self.dispatcher.end_stroke()
+        simulation = job.result(TIMEOUT)
+        self.assertTrue(relax.cancelled())
+        self.assertIsNotNone(simulation)
+        self.assertNotEqual(simulation.convergence.status, 'cancelled')
+        # the simulation continued from the live lattice
+        self.assertIs(self.dispatcher.live_lattice, live)
+        coarse = simulation.coarse_barrier(live.barrier.shape)
+        self.assertTrue(np.array_equal(live.barrier, coarse))
+        self.assertIsNotNone(self.dispatcher.plot_streamline(5))
+
+    def test_stroke_without_simulation(self):
+        # the pen went up outside the sketch area, nothing is simulated
+        self.draw(SKETCHES['plate'][0])
+        relax = self.dispatcher.relax_job
+        self.dispatcher.end_stroke()
+        relax.result(TIMEOUT)
+        self.assertTrue(relax.done())
+        start = time.time()
+        self.assertIsNone(self.dispatcher.plot_streamline(5))
+        self.assertLess(time.time() - start, 0.1)
+
+    def test_stroke_keeps_simulation(self):
+        self.draw(SKETCHES['plate'][0])
+        job = self.dispatcher.runSimulation()
+        self.dispatcher.end_stroke()
+        # a new stroke while the first one is simulated
+        self.draw(SKETCHES['cylinder'][0][:10])
+        self.assertFalse(job.cancelled())
+        self.assertIsNotNone(job.result(TIMEOUT))
+        self.dispatcher.end_stroke()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+'''Checks moving the flow between lattices of different sizes.
+
+Example (from the repository root, which has the configuration):
+    $ python -m pytest tests/test_windtunnel_multires.py
+'''
+import unittest
+
+import numpy as np
+
+import context
+from muscleplotter.modules.windtunnel.lattice import Lattice, resample
+from muscleplotter.modules.windtunnel.windtunnelsimulator import WindSim
+from test_windtunnel_backends import reference_barrier
+
+
+class Resampling(unittest.TestCase):
+
+    def test_same_size(self):
+        field = np.random.RandomState(0).rand(2, 6, 8)
+        self.assertTrue(np.allclose(resample(field, (6, 8)), field))
+
+    def test_linear_field(self):
+        # a ramp sampled at cell centres stays a ramp away from the edges
+        coarse = np.tile(np.arange(10.0), (10, 1))
+        fine = resample(coarse, (20, 20))
+        centres = (np.arange(20) + 0.5) / 2 - 0.5
+        self.assertTrue(np.allclose(fine[:, 1:-1], centres[1:-1]))
+
+    def test_refined_flow(self):
+        barrier = reference_barrier()
+        coarse = Lattice(barrier.shape[0] // 2, barrier.shape[1] // 2)
+        coarse.set_barrier(barrier[::2, ::2])
+        coarse.step(20)
+        fine = Lattice(*barrier.shape)
+        fine.set_barrier(barrier)
+        fine.refine_from(coarse)
+        self.assertTrue(np.isfinite(fine.populations).all())
+        self.assertAlmostEqual(fine.rho.mean(), coarse.rho.mean(), 2)
+
+    def test_new_solid_cells_at_rest(self):
+        barrier = reference_barrier()
+        coarse = Lattice(barrier.shape[0] // 2, barrier.shape[1] // 2)
+        coarse.step(5)
+        fine = Lattice(*barrier.shape)
+        fine.set_barrier(barrier)
+        fine.refine_from(coarse)
+        self.assertTrue(np.allclose(fine.ux[barrier], 0, atol=1e-15))
+        self.assertTrue((fine.ux[~barrier] > 0).all())
+
+    def test_updated_barrier(self):
+        barrier = reference_barrier()
+        lattice = Lattice(*barrier.shape)
+        lattice.set_barrier(barrier)
+        lattice.step(20)
+        flow = lattice.populations.copy()
+        grown = barrier.copy()
+        grown[40:45, 60:80] = True
+        lattice.update_barrier(grown)
+        added = grown & ~barrier
+        self.assertTrue(np.allclose(lattice.ux[added], 0, atol=1e-15))
+        self.assertTrue((lattice.populations[:, ~added] ==
+                         flow[:, ~added]).all())
+
+
+class CoarseLevels(unittest.TestCase):
+
+    def setUp(self):
+        context.wind_tunnel_settings(self, height=60, width=90,
+                                     coarse_levels=1, max_steps=400,
+                                     DEBUG=False)
+
+    def test_reynolds_number(self):
+        coarse = WindSim.coarse_lattice(reference_barrier(30, 45))
+        # half the cells across the tunnel, half the viscosity
+        self.assertAlmostEqual(coarse.viscosity, WindSim.viscosity / 2)
+        self.assertEqual(coarse.u0, WindSim.u0)
+
+    def test_full_size_check(self):
+        simulation = WindSim(reference_barrier())
+        convergence = simulation.run()
+        self.assertEqual(convergence.status, 'converged')
+        # the first checkpoint only compares against the interpolation
+        self.assertGreaterEqual(convergence.steps, 2 * WindSim.step_range)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+'''Checks simulating a directory of sketches headless.
+
+Example (from the repository root, which has the configuration):
+    $ python -m pytest tests/test_windtunnel_offline.py
+'''
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from PIL import Image
+
+import context
+from muscleplotter.modules.windtunnel import offline
+from muscleplotter.modules.windtunnel.windtunnelsimulator import WindSim
+from muscleplotter.modules.windtunnel.references import SKETCHES
+
+SHAPE = (40, 40)
+
+
+class OfflineBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.inputs = os.path.join(self.directory, 'inputs')
+        self.output = os.path.join(self.directory, 'output')
+        os.makedirs(self.inputs)
+        with open(os.path.join(self.inputs, 'cylinder.json'), 'w') as path:
+            json.dump([stroke.tolist() for stroke in SKETCHES['cylinder']],
+                      path)
+        image = np.full((80, 80), 255, np.uint8)
+        image[10:30, 20:30] = 0
+        Image.fromarray(image).save(os.path.join(self.inputs, 'box.png'))
+        context.wind_tunnel_settings(self, height=SHAPE[0], width=SHAPE[1],
+                                     coarse_levels=0, max_steps=40)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_directory(self):
+        self.assertEqual(offline.main([self.inputs, self.output,
+                                       '--processes', '1', '--render']), 0)
+        with open(os.path.join(self.output, 'summary.json')) as summary:
+            results = json.load(summary)
+        self.assertEqual([result['name'] for result in results],
+                         ['box', 'cylinder'])
+        box = np.load(os.path.join(self.output, 'box.npz'))
+        self.assertEqual(box['ux'].shape, SHAPE)
+        # north up image, row 0 of the lattice is the south end
+        self.assertTrue(box['barrier'][27, 12])
+        self.assertFalse(box['barrier'][12, 12])
+        self.assertEqual(len(box['lengths']), len(box['seeds']))
+        self.assertTrue(os.path.isfile(os.path.join(self.output,
+                                                    'cylinder.png')))
+
+    def test_broken_input(self):
+        with open(os.path.join(self.inputs, 'broken.json'), 'w') as path:
+            path.write('[[')
+        self.assertEqual(offline.main([self.inputs, self.output,
+                                       '--processes', '1']), 1)
+        with open(os.path.join(self.output, 'summary.json')) as summary:
+            statuses = dict((result['name'], result['status'])
+                            for result in json.load(summary))
+        self.assertEqual(statuses['broken'], 'error')
+        self.assertNotEqual(statuses['box'], 'error')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+'''Checks that the multi-process wind tunnel matches the single-process one.
+
+Example:
+    $ python -m unittest test_windtunnel_parallel
+'''
+import unittest
+
+import numpy as np
+
+import context
+from muscleplotter.modules.windtunnel.lattice import Lattice
+from muscleplotter.modules.windtunnel.parallel import ParallelLattice
+from test_windtunnel_backends import reference_barrier
+
+STEPS = 40
+
+
+class StripDecomposition(unittest.TestCase):
+
+    def test_matches_single_process(self):
+        barrier = reference_barrier()
+        reference = Lattice(*barrier.shape)
+        reference.set_barrier(barrier)
+        reference.step(STEPS)
+        # with four workers the strip edge at row 30 cuts the round barrier
+        for workers in (1, 4):
+            lattice = ParallelLattice(*barrier.shape, workers=workers)
+            try:
+                lattice.set_barrier(barrier)
+                lattice.step(STEPS)
+                for field in ('populations', 'rho', 'ux', 'uy'):
+                    self.assertTrue(
+                        np.array_equal(getattr(lattice, field),
+                                       getattr(reference, field)),
+                        '{0} differs with {1} workers'.format(field, workers))
+            finally:
+                lattice.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
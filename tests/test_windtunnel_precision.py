@@ -0,0 +1,50 @@
+'''Checks single precision wind simulations against double precision ones.
+
+Example:
+    $ python -m unittest test_windtunnel_precision
+'''
+import unittest
+
+import numpy as np
+
+import context
+from muscleplotter.modules.windtunnel.lattice import Lattice
+from muscleplotter.modules.windtunnel.backends import BACKENDS
+from muscleplotter.modules.windtunnel.references import (
+    SKETCHES, reference_barrier, streamline_deviation)
+
+SHAPE = (200, 200)
+STEPS = 200
+# in anoto pixels, a lattice cell is 21.5
+MAX_DEVIATION = 5
+
+
+class SinglePrecision(unittest.TestCase):
+
+    def test_stays_single(self):
+        for name, backend in sorted(BACKENDS.items()):
+            if not backend.available():
+                continue
+            lattice = Lattice(60, 90, backend=backend(), dtype=np.float32)
+            lattice.set_barrier(reference_barrier('plate', (60, 90)))
+            lattice.step(5)
+            for field in ('populations', 'rho', 'ux', 'uy'):
+                self.assertEqual(getattr(lattice, field).dtype, np.float32,
+                                 '{0} of {1}'.format(field, name))
+
+    def test_streamlines_match_double(self):
+        for name in sorted(SKETCHES):
+            barrier = reference_barrier(name, SHAPE)
+            flows = []
+            for dtype in (np.float64, np.float32):
+                lattice = Lattice(*SHAPE, dtype=dtype)
+                lattice.set_barrier(barrier)
+                lattice.step(STEPS)
+                flows.append((lattice.ux, lattice.uy))
+            deviation = streamline_deviation(flows[1], flows[0],
+                                             range(10, 191, 10), barrier)
+            self.assertLess(deviation, MAX_DEVIATION, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+'''Checks running a simulation and turning its snapshots into frames.
+
+Example (from the repository root, which has the configuration):
+    $ python -m pytest tests/test_windtunnel_renderer.py
+'''
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+import numpy as np
+
+import context
+from muscleplotter.modules.windtunnel.windtunnelsimulator import WindSim
+from muscleplotter.modules.windtunnel.renderer import (Renderer, colour_frame,
+                                                       colormap_lut)
+
+SHAPE = (40, 40)
+# stands in for ffmpeg, writes the raw frames to the movie path
+FAKE_FFMPEG = '#!/bin/sh\nfor path; do :; done\ncat > "$path"\n'
+
+
+def block_barrier():
+    barrier = np.zeros(SHAPE, bool)
+    barrier[15:25, 10:14] = True
+    return barrier
+
+
+class Simulation(unittest.TestCase):
+
+    def setUp(self):
+        context.wind_tunnel_settings(self, height=SHAPE[0], width=SHAPE[1],
+                                     coarse_levels=0, max_steps=60,
+                                     DEBUG=False)
+        self.simulation = WindSim(block_barrier())
+
+    def tearDown(self):
+        self.simulation.close()
+
+    def test_run(self):
+        convergence = self.simulation.run()
+        self.assertNotEqual(convergence.status, 'running')
+        self.assertEqual(convergence.steps, WindSim.max_steps)
+        for field in (self.simulation.ux, self.simulation.uy,
+                      self.simulation.rho):
+            self.assertEqual(field.shape, SHAPE)
+            self.assertTrue(np.isfinite(field).all())
+        # the wind still blows through the tunnel
+        self.assertGreater(self.simulation.ux[~block_barrier()].mean(), 0)
+        self.assertTrue((self.simulation.barrier == block_barrier()).all())
+
+    def test_snapshots(self):
+        steps = [snapshot.steps for snapshot in self.simulation.snapshots(20)]
+        self.assertEqual(steps, [20, 40, 60])
+        self.assertEqual(self.simulation.convergence.status, 'budget')
+
+    def test_snapshot_fields(self):
+        snapshot = next(self.simulation.snapshots(10))
+        self.assertEqual(snapshot.status, 'running')
+        self.assertEqual(snapshot.curl().shape, SHAPE)
+        # a copy, stepping on does not change it
+        ux = snapshot.ux.copy()
+        self.simulation.step(10)
+        self.assertTrue((snapshot.ux == ux).all())
+
+
+class ColourFrame(unittest.TestCase):
+
+    def test_frame(self):
+        curl = np.zeros(SHAPE)
+        curl[0] = 0.1
+        image = colour_frame(curl, block_barrier())
+        self.assertEqual(image.shape, SHAPE + (3,))
+        self.assertEqual(image.dtype, np.uint8)
+        lut = colormap_lut()
+        # north up, barrier cells are black
+        self.assertTrue((image[-1] == lut[-1]).all())
+        self.assertTrue((image[::-1][block_barrier()] == 0).all())
+        self.assertTrue((image[::-1][~block_barrier()] != 0).any(-1).all())
+
+    def test_scale(self):
+        curl = np.random.RandomState(0).uniform(-0.2, 0.2, SHAPE)
+        image = colour_frame(curl, block_barrier(), scale=3)
+        self.assertEqual(image.shape, (SHAPE[0] * 3, SHAPE[1] * 3, 3))
+        self.assertTrue((image[::3, ::3] == colour_frame(
+            curl, block_barrier())).all())
+
+
+class Movie(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.environ['PATH']
+        context.wind_tunnel_settings(self, height=SHAPE[0], width=SHAPE[1],
+                                     coarse_levels=0, max_steps=60,
+                                     DEBUG=False)
+
+    def tearDown(self):
+        os.environ['PATH'] = self.path
+        shutil.rmtree(self.directory)
+
+    def fake_ffmpeg(self):
+        ffmpeg = os.path.join(self.directory, 'ffmpeg')
+        with open(ffmpeg, 'w') as script:
+            script.write(FAKE_FFMPEG)
+        os.chmod(ffmpeg, stat.S_IRWXU)
+        os.environ['PATH'] = self.directory + os.pathsep + self.path
+
+    def test_frames(self):
+        self.fake_ffmpeg()
+        movie = os.path.join(self.directory, 'movie.mp4')
+        renderer = Renderer(movie, WindSim.height, WindSim.width, scale=2)
+        self.assertTrue(renderer.active)
+        simulation = WindSim(block_barrier())
+        simulation.run(renderer)
+        simulation.close()
+        renderer.close()
+        self.assertFalse(renderer.active)
+        self.assertEqual(renderer.frames, 3)
+        with open(movie, 'rb') as frames:
+            frames = np.frombuffer(frames.read(), np.uint8)
+        self.assertEqual(frames.size, renderer.frames * 80 * 80 * 3)
+        last = frames.reshape(-1, 80, 80, 3)[-1]
+        self.assertTrue((last == renderer.frame(
+            simulation.curl(simulation.ux, simulation.uy),
+            simulation.barrier)).all())
+
+    def test_without_ffmpeg(self):
+        os.environ['PATH'] = self.directory
+        renderer = Renderer(os.path.join(self.directory, 'movie.mp4'),
+                            WindSim.height, WindSim.width)
+        self.assertFalse(renderer.active)
+        simulation = WindSim(block_barrier())
+        # the simulation runs all the same
+        self.assertEqual(simulation.run(renderer).steps, WindSim.max_steps)
+        simulation.close()
+        renderer.close()
+        self.assertEqual(renderer.frames, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+'''Checks how pen strokes become the barrier of the wind tunnel.
+
+Example:
+    $ python -m unittest test_windtunnel_sketch
+'''
+import unittest
+
+import numpy as np
+
+import context
+from muscleplotter.modules.windtunnel.sketch import (rasterize_strokes,
+                                                     sketch_barrier)
+
+# left, top, right, bottom of a 100 by 100 pen unit sketch area
+AREA = (0, 0, 99, 99)
+
+
+class StrokeRasterization(unittest.TestCase):
+
+    def test_segments_are_connected(self):
+        grid = rasterize_strokes([[(0, 0), (9, 9)], [(0, 9), (9, 9)]],
+                                 (10, 10))
+        self.assertTrue(grid[np.arange(10), np.arange(10)].all())
+        self.assertTrue(grid[9].all())
+        self.assertEqual(grid.sum(), 19)
+
+    def test_single_point(self):
+        grid = rasterize_strokes([[(2, 3)], []], (5, 5))
+        self.assertTrue(grid[3, 2])
+        self.assertEqual(grid.sum(), 1)
+
+    def test_bottom_is_row_zero(self):
+        # a horizontal stroke near the bottom of the sketch area
+        barrier = sketch_barrier([[(0, 95), (99, 95)]], AREA, (10, 10),
+                                 dilate_radius=10)
+        self.assertTrue(barrier[0].all())
+        self.assertFalse(barrier[5:].any())
+
+    def test_supersampled_cells_must_be_covered(self):
+        # a thin stroke covers no lattice cell completely
+        stroke = [[(0, 50), (99, 50)]]
+        self.assertTrue(sketch_barrier(stroke, AREA, (10, 10)).any())
+        self.assertFalse(sketch_barrier(stroke, AREA, (10, 10), 4).any())
+        self.assertTrue(sketch_barrier(stroke, AREA, (10, 10), 4,
+                                       dilate_radius=10).any())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+'''Checks the tracer and the stream function lookup against flows with
+known streamlines.
+
+Example:
+    $ python -m unittest test_windtunnel_streamlines
+'''
+import unittest
+
+import numpy as np
+
+import context
+from muscleplotter.modules.windtunnel.streamlines import (StreamFunction,
+                                                          trace_streamlines,
+                                                          STEP)
+
+SHAPE = (60, 90)
+# points of a line that crosses the whole lattice
+CROSSING = int((SHAPE[1] - 1) / STEP) + 1
+
+
+class Tracer(unittest.TestCase):
+
+    def test_uniform_flow(self):
+        ux = np.full(SHAPE, 0.1)
+        uy = np.zeros(SHAPE)
+        xs, ys, lengths = trace_streamlines(ux, uy, [10, 30.5])
+        self.assertEqual(list(lengths), [CROSSING, CROSSING])
+        self.assertTrue(np.allclose(xs[0], np.arange(CROSSING) * STEP))
+        self.assertTrue(np.allclose(ys[1], 30.5))
+
+    def test_rk2_agrees_with_rk4(self):
+        ux = np.full(SHAPE, 0.1)
+        uy = np.full(SHAPE, 0.01)
+        rk2 = trace_streamlines(ux, uy, [5, 20, 40], method='rk2')
+        rk4 = trace_streamlines(ux, uy, [5, 20, 40], method='rk4')
+        self.assertTrue((rk2[2] == rk4[2]).all())
+        self.assertTrue(np.allclose(rk2[0], rk4[0], equal_nan=True))
+        self.assertTrue(np.allclose(rk2[1], rk4[1], equal_nan=True))
+        self.assertRaises(ValueError, trace_streamlines, ux, uy, [5],
+                          method='euler')
+
+    def test_barrier(self):
+        ux = np.full(SHAPE, 0.1)
+        uy = np.zeros(SHAPE)
+        barrier = np.zeros(SHAPE, bool)
+        barrier[10:20, 40:45] = True
+        xs, ys, lengths = trace_streamlines(ux, uy, [15, 30],
+                                            barrier=barrier)
+        # only the seed in front of the barrier stops, right before it
+        self.assertEqual(lengths[1], CROSSING)
+        self.assertLess(lengths[0], CROSSING)
+        end = xs[0, lengths[0] - 1]
+        self.assertTrue(39 <= end < 39.5)
+        self.assertTrue(np.isnan(xs[0, lengths[0]:]).all())
+        self.assertTrue(np.isnan(ys[0, lengths[0]:]).all())
+
+    def test_leaves_the_lattice(self):
+        ux = np.full(SHAPE, 0.1)
+        uy = np.full(SHAPE, 0.1)
+        xs, ys, lengths = trace_streamlines(ux, uy, [50, 5])
+        self.assertLess(lengths[0], lengths[1])
+        self.assertLessEqual(np.nanmax(ys[0]), SHAPE[0] - 1)
+        self.assertTrue(np.isnan(ys[0, lengths[0]:]).all())
+
+    def test_upstream_flow(self):
+        ux = np.full(SHAPE, 0.1)
+        uy = np.zeros(SHAPE)
+        # the flow turns back upstream in the lower half past column 30
+        ux[:SHAPE[0] // 2, 30:] = -0.1
+        xs, ys, lengths = trace_streamlines(ux, uy, [10, 45])
+        self.assertEqual(lengths[1], CROSSING)
+        self.assertLess(np.nanmax(xs[0]), 30)
+
+
+class StreamFunctionLookup(unittest.TestCase):
+
+    def test_tilted_flow(self):
+        # straight lines rising one row every ten columns
+        ux = np.full(SHAPE, 0.1)
+        uy = np.full(SHAPE, 0.01)
+        x, y = StreamFunction(ux, uy).streamline(12.5)
+        self.assertEqual(len(x), SHAPE[1])
+        self.assertTrue(np.allclose(y, 12.5 + x / 10))
+
+    def test_leaves_the_lattice(self):
+        ux = np.full(SHAPE, 0.1)
+        uy = np.full(SHAPE, 0.01)
+        x, y = StreamFunction(ux, uy).streamline(54.75)
+        self.assertEqual(len(x), 43)
+        self.assertTrue(y.max() <= SHAPE[0] - 1)
+
+    def test_matches_tracer_around_vortex(self):
+        # solid body rotation around a point right of the lattice
+        rows, columns = np.mgrid[0:SHAPE[0], 0:SHAPE[1]].astype(float)
+        ux = -(rows - 30) / 100
+        uy = (columns - 150) / 100
+        ux[rows < 30] *= -1
+        uy[rows < 30] *= -1
+        lookup = StreamFunction(ux, uy)
+        xs, ys, lengths = trace_streamlines(ux, uy, [5, 15])
+        for seed, start_y in enumerate([5, 15]):
+            x, y = lookup.streamline(start_y)
+            traced = np.interp(x, xs[seed, :lengths[seed]],
+                               ys[seed, :lengths[seed]], right=np.nan)
+            self.assertLess(np.nanmax(np.abs(traced - y)), 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
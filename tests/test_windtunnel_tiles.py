@@ -0,0 +1,111 @@
+'''Checks that skipping solid tiles leaves the flow untouched.
+
+Example (from the repository root, which has the configuration):
+    $ python -m pytest tests/test_windtunnel_tiles.py
+
+The kernel tests are skipped when numba is not installed.
+'''
+import unittest
+
+import numpy as np
+
+import context
+from muscleplotter.modules.windtunnel.lattice import Lattice
+from muscleplotter.modules.windtunnel.backends import NumbaBackend
+from muscleplotter.modules.windtunnel.tiles import (Tiles, SKIP, COMPUTE,
+                                                    FREEZE)
+from muscleplotter.modules.windtunnel.windtunnelsimulator import WindSim
+from test_windtunnel_backends import reference_barrier
+
+TOLERANCE = 1e-10
+STEPS = 60
+SIZE = 8
+
+
+def block_barrier():
+    barrier = reference_barrier()
+    # a filled block covering whole tiles
+    barrier[16:40, 48:72] = True
+    return barrier
+
+
+class TilePlan(unittest.TestCase):
+
+    def test_solid_tiles(self):
+        barrier = block_barrier()
+        tiles = Tiles(barrier.shape[0], barrier.shape[1], SIZE)
+        tiles.set_barrier(barrier)
+        self.assertEqual(tiles.shape, (8, 12))
+        states = tiles.plan(np.zeros(barrier.shape), np.zeros(barrier.shape))
+        # the block and one tile of the edge cells of the reference barrier
+        self.assertEqual((states == SKIP).sum(), 10)
+        self.assertTrue((states[2:5, 6:9] == SKIP).all())
+        self.assertAlmostEqual(tiles.skipped_fraction,
+                               tiles.cells[states == SKIP].sum() /
+                               float(barrier.size))
+
+    def test_quiescent_tiles(self):
+        shape = (20, 20)
+        tiles = Tiles(shape[0], shape[1], SIZE, tolerance=1e-3, every=5)
+        tiles.set_barrier(np.zeros(shape, bool))
+        ux = np.zeros(shape)
+        uy = np.zeros(shape)
+        for step in range(6):
+            states = tiles.plan(ux, uy)
+        # only the tile that keeps changing is computed between full steps
+        ux[0, 0] = 1
+        for step in range(6):
+            states = tiles.plan(ux, uy)
+        self.assertEqual((states == FREEZE).sum(), 8)
+        self.assertEqual(states[0, 0], COMPUTE)
+        tiles.wake()
+        self.assertTrue((tiles.plan(ux, uy) == COMPUTE).all())
+
+
+class TiledKernel(unittest.TestCase):
+
+    def setUp(self):
+        if not NumbaBackend.available():
+            raise unittest.SkipTest('numba is not installed')
+        self.barrier = block_barrier()
+        self.reference = Lattice(*self.barrier.shape)
+        self.reference.set_barrier(self.barrier)
+        self.reference.step(STEPS)
+
+    def test_fluid_cells_exact(self):
+        lattice = Lattice(*self.barrier.shape, backend=NumbaBackend())
+        lattice.use_tiles(Tiles(self.barrier.shape[0],
+                                self.barrier.shape[1], SIZE))
+        lattice.set_barrier(self.barrier)
+        lattice.step(STEPS)
+        fluid = ~self.barrier
+        for field in ('rho', 'ux', 'uy'):
+            difference = np.abs(getattr(lattice, field)[fluid] -
+                                getattr(self.reference, field)[fluid]).max()
+            self.assertLess(difference, TOLERANCE,
+                            '{0} deviates by {1}'.format(field, difference))
+        self.assertGreater(lattice.tiles.skipped_fraction, 0.09)
+
+
+class TiledBackends(unittest.TestCase):
+
+    def setUp(self):
+        context.wind_tunnel_settings(self, tile_size=SIZE)
+
+    def test_untiled_backend(self):
+        # numpy computes every cell, the tiles would only cost time
+        WindSim.backend = 'numpy'
+        self.assertIsNone(WindSim.coarse_lattice(block_barrier()).tiles)
+
+    def test_tiled_backend(self):
+        if not NumbaBackend.available():
+            raise unittest.SkipTest('numba is not installed')
+        WindSim.backend = 'numba'
+        lattice = WindSim.coarse_lattice(block_barrier())
+        self.assertEqual(lattice.tiles.size, SIZE)
+        WindSim.tile_size = 0
+        self.assertIsNone(WindSim.coarse_lattice(block_barrier()).tiles)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+'''Checks continuing a simulation from the flow of an earlier sketch.
+
+Example (from the repository root, which has the configuration):
+    $ python -m pytest tests/test_windtunnel_warmstart.py
+'''
+import unittest
+
+import numpy as np
+
+import context
+from muscleplotter.modules.windtunnel.lattice import Lattice
+from muscleplotter.modules.windtunnel.windtunnelsimulator import WindSim
+from test_windtunnel_backends import reference_barrier
+
+TOLERANCE = 0.03
+MAX_STEPS = 2000
+SHAPE = (40, 40)
+
+
+def grown(barrier):
+    """The barrier with a small block added behind the cylinder
+    """
+    barrier = barrier.copy()
+    barrier[40:44, 60:64] = True
+    return barrier
+
+
+class WarmStart(unittest.TestCase):
+
+    def setUp(self):
+        self.barrier = reference_barrier()
+        self.previous = Lattice(*self.barrier.shape)
+        self.previous.set_barrier(self.barrier)
+        self.previous.step(40)
+
+    def test_continues_flow(self):
+        barrier = grown(self.barrier)
+        lattice = Lattice(*barrier.shape)
+        lattice.set_barrier(barrier)
+        lattice.warm_start(self.previous)
+        kept = barrier == self.barrier
+        self.assertTrue(np.allclose(lattice.populations[:, kept],
+                                    self.previous.populations[:, kept]))
+        # new solid cells start over at rest
+        self.assertTrue(np.allclose(lattice.ux[~kept], 0))
+        self.assertTrue(np.allclose(lattice.uy[~kept], 0))
+
+    def test_shape_mismatch(self):
+        lattice = Lattice(self.barrier.shape[0] // 2,
+                          self.barrier.shape[1] // 2)
+        self.assertRaises(ValueError, lattice.warm_start, self.previous)
+
+    def test_fewer_steps(self):
+        self.previous.run_until_converged(TOLERANCE, MAX_STEPS)
+        barrier = grown(self.barrier)
+        cold = Lattice(*barrier.shape)
+        cold.set_barrier(barrier)
+        warm = Lattice(*barrier.shape)
+        warm.set_barrier(barrier)
+        warm.warm_start(self.previous)
+        cold = cold.run_until_converged(TOLERANCE, MAX_STEPS)
+        warm = warm.run_until_converged(TOLERANCE, MAX_STEPS)
+        self.assertEqual(cold.status, 'converged')
+        self.assertEqual(warm.status, 'converged')
+        self.assertLess(warm.steps, cold.steps)
+
+
+class PreviousSimulation(unittest.TestCase):
+
+    def setUp(self):
+        context.wind_tunnel_settings(self, height=SHAPE[0], width=SHAPE[1],
+                                     coarse_levels=1, max_steps=60,
+                                     DEBUG=False)
+        self.barrier = np.zeros(SHAPE, bool)
+        self.barrier[15:25, 10:14] = True
+
+    def test_previous(self):
+        previous = WindSim(self.barrier)
+        previous.run()
+        simulation = WindSim(self.barrier, previous)
+        # no coarse levels left to relax, the flow is there already
+        self.assertEqual(simulation.levels, 0)
+        self.assertTrue(np.allclose(simulation.lattice.populations,
+                                    previous.lattice.populations))
+
+    def test_diverged_previous(self):
+        flow = WindSim.viscosity, WindSim.u0
+        # far too fast for so little viscosity
+        WindSim.viscosity, WindSim.u0 = 0.005, 0.4
+        previous = WindSim(self.barrier)
+        previous.run()
+        self.assertEqual(previous.convergence.status, 'diverged')
+        WindSim.viscosity, WindSim.u0 = flow
+        simulation = WindSim(self.barrier, previous)
+        # starts cold, from uniform flow on the coarse levels
+        self.assertEqual(simulation.levels, WindSim.coarse_levels)
+        self.assertTrue(np.isfinite(simulation.lattice.populations).all())
+        self.assertTrue(np.allclose(simulation.ux[~self.barrier],
+                                    WindSim.u0))
+        self.assertNotEqual(simulation.run().status, 'diverged')
+
+
+if __name__ == '__main__':
+    unittest.main()
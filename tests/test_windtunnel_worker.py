@@ -0,0 +1,69 @@
+'''Checks that background simulation jobs supersede and cancel each other.
+
+Example:
+    $ python -m unittest test_windtunnel_worker
+'''
+import threading
+import unittest
+
+import context
+from muscleplotter.modules.windtunnel.worker import Worker
+
+
+def steps_until_cancelled(job, started, steps=1000):
+    started.set()
+    for step in range(steps):
+        if job.cancelled():
+            return None
+        job.report(step)
+        threading.Event().wait(0.001)
+    return steps
+
+
+class BackgroundJobs(unittest.TestCase):
+
+    def test_result(self):
+        progress = []
+        job = Worker().submit(lambda job: job.report(1) or 'flow',
+                              progress.append)
+        self.assertEqual(job.result(5), 'flow')
+        self.assertEqual(progress, [1])
+
+    def test_bounded_wait(self):
+        started = threading.Event()
+        job = Worker().submit(lambda job: steps_until_cancelled(job, started))
+        started.wait(5)
+        self.assertIsNone(job.result(0.01))
+        self.assertFalse(job.done())
+        job.cancel()
+        self.assertIsNone(job.result(5))
+        self.assertTrue(job.done())
+
+    def test_new_job_supersedes(self):
+        worker = Worker()
+        started = threading.Event()
+        first = worker.submit(lambda job: steps_until_cancelled(job, started))
+        started.wait(5)
+        second = worker.submit(lambda job: 'latest')
+        self.assertEqual(second.result(5), 'latest')
+        self.assertTrue(first.cancelled())
+        self.assertIsNone(first.result(0))
+
+    def test_queued_job(self):
+        worker = Worker()
+        started = threading.Event()
+        first = worker.submit(lambda job: steps_until_cancelled(job, started,
+                                                                20))
+        started.wait(5)
+        second = worker.submit(lambda job: first.done(), supersede=False)
+        self.assertTrue(second.result(5))
+        self.assertEqual(first.result(0), 20)
+
+    def test_failure(self):
+        job = Worker().submit(lambda job: 1 / 0)
+        self.assertIsNone(job.result(5))
+        self.assertIsInstance(job.error, ZeroDivisionError)
+
+
+if __name__ == '__main__':
+    unittest.main()